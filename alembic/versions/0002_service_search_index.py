@@ -0,0 +1,34 @@
+"""service full-text search index
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 09:10:00.000000
+
+GIN expression index backing GET /api/services/search on PostgreSQL. Other
+databases use the in-memory index in app.search, so this is a no-op there.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    # IF NOT EXISTS: databases built with create_all may already have it
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_services_search_vector ON services "
+        "USING gin (to_tsvector('english', coalesce(name, '') || ' ' || coalesce(description, '')))"
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute("DROP INDEX IF EXISTS ix_services_search_vector")
@@ -0,0 +1,47 @@
+"""order access pattern indexes
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 09:20:00.000000
+
+Indexes for per-client/per-worker listings, payment intent lookups and the
+open unassigned order queue. On PostgreSQL they are built CONCURRENTLY so
+a large orders table stays writable during the upgrade.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+OPEN_UNASSIGNED_ORDERS = "worker_id IS NULL AND status IN ('PENDING', 'PAID')"
+
+INDEXES = [
+    ('ix_orders_client_id_created_at', ['client_id', 'created_at'], {}),
+    ('ix_orders_worker_id_created_at', ['worker_id', 'created_at'], {}),
+    ('ix_orders_service_id', ['service_id'], {}),
+    ('ix_orders_payment_intent_id', ['payment_intent_id'], {'unique': True}),
+    ('ix_orders_open_unassigned', ['created_at', 'id'], {
+        'postgresql_where': sa.text(OPEN_UNASSIGNED_ORDERS),
+        'sqlite_where': sa.text(OPEN_UNASSIGNED_ORDERS),
+    }),
+]
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, columns, kwargs in INDEXES:
+                op.create_index(name, 'orders', columns, postgresql_concurrently=True, **kwargs)
+    else:
+        for name, columns, kwargs in INDEXES:
+            op.create_index(name, 'orders', columns, **kwargs)
+
+
+def downgrade() -> None:
+    for name, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name='orders')
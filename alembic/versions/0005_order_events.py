@@ -0,0 +1,49 @@
+"""order events outbox
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 09:40:00.000000
+
+Transactional outbox for order notifications. Rows are written with the
+order change and drained by the dispatcher in app.outbox; the id doubles as
+the sequence number clients resume from.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'order_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('order_id', sa.Integer(), nullable=False),
+        sa.Column('type', sa.String(), nullable=False),
+        sa.Column('role', sa.String(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('dispatched_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['order_id'], ['orders.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_order_events_user_id_id', 'order_events', ['user_id', 'id'])
+    op.create_index(
+        'ix_order_events_undispatched',
+        'order_events',
+        ['id'],
+        postgresql_where=sa.text('dispatched_at IS NULL'),
+        sqlite_where=sa.text('dispatched_at IS NULL')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_order_events_undispatched', table_name='order_events')
+    op.drop_index('ix_order_events_user_id_id', table_name='order_events')
+    op.drop_table('order_events')
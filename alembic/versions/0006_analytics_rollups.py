@@ -0,0 +1,53 @@
+"""analytics rollup tables
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 09:50:00.000000
+
+Incrementally maintained aggregates behind /api/admin/stats. Existing
+orders are not counted until backfill_analytics.py has been run.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'daily_category_stats',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('category', sa.String(), nullable=False),
+        sa.Column('shard', sa.Integer(), nullable=False),
+        sa.Column('orders_created', sa.Integer(), nullable=False),
+        sa.Column('orders_paid', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'category', 'shard')
+    )
+    op.create_table(
+        'order_status_counts',
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('shard', sa.Integer(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('status', 'shard')
+    )
+    op.create_table(
+        'worker_completion_stats',
+        sa.Column('worker_id', sa.Integer(), nullable=False),
+        sa.Column('completed', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Float(), nullable=False),
+        sa.Column('last_completed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['worker_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('worker_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('worker_completion_stats')
+    op.drop_table('order_status_counts')
+    op.drop_table('daily_category_stats')
@@ -0,0 +1,217 @@
+import random
+from collections import Counter
+from datetime import date, datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from . import models
+from .config import settings
+
+OrderStatus = models.OrderStatus
+
+# (order, status before, status after); None before means the order was just created
+Transition = Tuple[models.Order, Optional[OrderStatus], OrderStatus]
+
+def _upsert(dialect_name: str, model, rows: List[dict], keys: List[str], increments: List[str], replace: List[str] = ()):
+    # INSERT ... ON CONFLICT (keys) DO UPDATE SET col = col + excluded.col
+    table = model.__table__
+    insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    statement = insert(table).values(rows)
+    updates = {name: table.c[name] + statement.excluded[name] for name in increments}
+    updates.update({name: statement.excluded[name] for name in replace})
+    return statement.on_conflict_do_update(index_elements=keys, set_=updates)
+
+def rollup_statements(dialect_name: str, transitions: Iterable[Transition], categories: Dict[int, str]) -> list:
+    # Deltas are aggregated first so each statement touches every key at most once,
+    # and rows are sorted so concurrent transactions take row locks in the same order
+    now = datetime.now(timezone.utc)
+    status_deltas: Counter = Counter()
+    daily: Dict[str, Dict[str, float]] = {}
+    workers: Dict[int, Dict[str, float]] = {}
+    for order, old_status, new_status in transitions:
+        if old_status == new_status:
+            continue
+        status_deltas[new_status.value] += 1
+        if old_status is not None:
+            status_deltas[old_status.value] -= 1
+        if old_status is None or new_status == OrderStatus.PAID:
+            row = daily.setdefault(categories.get(order.service_id) or "", {"orders_created": 0, "orders_paid": 0, "revenue": 0.0})
+            if old_status is None:
+                row["orders_created"] += 1
+            if new_status == OrderStatus.PAID:
+                row["orders_paid"] += 1
+                row["revenue"] += order.total_amount or 0
+        if new_status == OrderStatus.COMPLETED and order.worker_id is not None:
+            row = workers.setdefault(order.worker_id, {"completed": 0, "revenue": 0.0})
+            row["completed"] += 1
+            row["revenue"] += order.total_amount or 0
+
+    shard = random.randrange(settings.analytics_rollup_shards)
+    statements = []
+    status_rows = [{"status": status, "shard": shard, "count": delta} for status, delta in sorted(status_deltas.items()) if delta]
+    if status_rows:
+        statements.append(_upsert(dialect_name, models.OrderStatusCount, status_rows, ["status", "shard"], ["count"]))
+    if daily:
+        daily_rows = [{"day": now.date(), "category": category, "shard": shard, **values} for category, values in sorted(daily.items())]
+        statements.append(_upsert(
+            dialect_name,
+            models.DailyCategoryStats,
+            daily_rows,
+            ["day", "category", "shard"],
+            ["orders_created", "orders_paid", "revenue"]
+        ))
+    if workers:
+        worker_rows = [{"worker_id": worker_id, "last_completed_at": now, **values} for worker_id, values in sorted(workers.items())]
+        statements.append(_upsert(
+            dialect_name,
+            models.WorkerCompletionStats,
+            worker_rows,
+            ["worker_id"],
+            ["completed", "revenue"],
+            ["last_completed_at"]
+        ))
+    return statements
+
+def _needs_category(transitions: List[Transition], categories: Dict[int, str]) -> List[int]:
+    return list({
+        order.service_id
+        for order, old_status, new_status in transitions
+        if (old_status is None or new_status == OrderStatus.PAID) and order.service_id not in categories
+    })
+
+async def record_transitions(db: AsyncSession, transitions: List[Transition], categories: Dict[int, str] = None):
+    # Staged on the caller's transaction, next to the status change itself
+    categories = dict(categories or {})
+    missing = _needs_category(transitions, categories)
+    if missing:
+        result = await db.execute(select(models.Service.id, models.Service.category).where(models.Service.id.in_(missing)))
+        categories.update(result.all())
+    for statement in rollup_statements(db.bind.dialect.name, transitions, categories):
+        await db.execute(statement)
+
+def record_transitions_sync(db: Session, transitions: List[Transition], categories: Dict[int, str] = None):
+    categories = dict(categories or {})
+    missing = _needs_category(transitions, categories)
+    if missing:
+        result = db.execute(select(models.Service.id, models.Service.category).where(models.Service.id.in_(missing)))
+        categories.update(result.all())
+    for statement in rollup_statements(db.bind.dialect.name, transitions, categories):
+        db.execute(statement)
+
+def _as_date(value) -> date:
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+def backfill(db: Session) -> dict:
+    # Rebuilds every rollup from the orders table in one transaction. Payment
+    # time is not stored, so paid revenue is dated by the order's last update.
+    is_postgres = db.bind.dialect.name == "postgresql"
+    if is_postgres:
+        # Blocks order writes until commit so no transition is counted twice or lost
+        db.execute(text("LOCK TABLE orders IN SHARE MODE"))
+
+    def utc_day(column):
+        return func.date(func.timezone("UTC", column)) if is_postgres else func.date(column)
+
+    paid_at = func.coalesce(models.Order.updated_at, models.Order.created_at)
+    paid_or_later = models.Order.status.in_([OrderStatus.PAID, OrderStatus.COMPLETED])
+
+    for model in (models.OrderStatusCount, models.DailyCategoryStats, models.WorkerCompletionStats):
+        db.execute(delete(model))
+
+    status_rows = [
+        {"status": status.value, "shard": 0, "count": count}
+        for status, count in db.execute(
+            select(models.Order.status, func.count()).group_by(models.Order.status)
+        )
+        if status is not None
+    ]
+
+    category = func.coalesce(models.Service.category, "")
+    daily: Dict[Tuple[date, str], dict] = {}
+    created = db.execute(
+        select(utc_day(models.Order.created_at), category, func.count())
+        .join(models.Service, models.Service.id == models.Order.service_id)
+        .group_by(utc_day(models.Order.created_at), category)
+    )
+    for day, day_category, count in created:
+        daily[(_as_date(day), day_category)] = {"orders_created": count, "orders_paid": 0, "revenue": 0.0}
+    paid = db.execute(
+        select(utc_day(paid_at), category, func.count(), func.sum(models.Order.total_amount))
+        .join(models.Service, models.Service.id == models.Order.service_id)
+        .where(paid_or_later)
+        .group_by(utc_day(paid_at), category)
+    )
+    for day, day_category, count, revenue in paid:
+        row = daily.setdefault((_as_date(day), day_category), {"orders_created": 0, "orders_paid": 0, "revenue": 0.0})
+        row["orders_paid"] = count
+        row["revenue"] = revenue or 0.0
+    daily_rows = [
+        {"day": day, "category": day_category, "shard": 0, **values}
+        for (day, day_category), values in daily.items()
+    ]
+
+    worker_rows = [
+        {"worker_id": worker_id, "completed": count, "revenue": revenue or 0.0, "last_completed_at": last_completed_at}
+        for worker_id, count, revenue, last_completed_at in db.execute(
+            select(models.Order.worker_id, func.count(), func.sum(models.Order.total_amount), func.max(paid_at))
+            .where(models.Order.status == OrderStatus.COMPLETED, models.Order.worker_id.is_not(None))
+            .group_by(models.Order.worker_id)
+        )
+    ]
+
+    for model, rows in (
+        (models.OrderStatusCount, status_rows),
+        (models.DailyCategoryStats, daily_rows),
+        (models.WorkerCompletionStats, worker_rows)
+    ):
+        if rows:
+            db.execute(model.__table__.insert(), rows)
+    db.commit()
+    return {"statuses": len(status_rows), "days": len(daily_rows), "workers": len(worker_rows)}
+
+async def get_status_counts(db: AsyncSession) -> Dict[str, int]:
+    result = await db.execute(
+        select(models.OrderStatusCount.status, func.sum(models.OrderStatusCount.count))
+        .group_by(models.OrderStatusCount.status)
+    )
+    counts = {status.value: 0 for status in OrderStatus}
+    counts.update({status: int(count) for status, count in result})
+    return counts
+
+async def get_daily_stats(db: AsyncSession, start: date, end: date, category: Optional[str] = None) -> List[dict]:
+    query = (
+        select(
+            models.DailyCategoryStats.day,
+            models.DailyCategoryStats.category,
+            func.sum(models.DailyCategoryStats.orders_created),
+            func.sum(models.DailyCategoryStats.orders_paid),
+            func.sum(models.DailyCategoryStats.revenue)
+        )
+        .where(models.DailyCategoryStats.day >= start, models.DailyCategoryStats.day <= end)
+        .group_by(models.DailyCategoryStats.day, models.DailyCategoryStats.category)
+        .order_by(models.DailyCategoryStats.day, models.DailyCategoryStats.category)
+    )
+    if category is not None:
+        query = query.where(models.DailyCategoryStats.category == category)
+    result = await db.execute(query)
+    return [
+        {"day": _as_date(day), "category": row_category, "orders_created": created, "orders_paid": paid, "revenue": revenue}
+        for day, row_category, created, paid, revenue in result
+    ]
+
+async def get_worker_stats(db: AsyncSession, limit: int = 20) -> List[dict]:
+    result = await db.execute(
+        select(
+            models.WorkerCompletionStats.worker_id,
+            models.User.username,
+            models.WorkerCompletionStats.completed,
+            models.WorkerCompletionStats.revenue,
+            models.WorkerCompletionStats.last_completed_at
+        )
+        .join(models.User, models.User.id == models.WorkerCompletionStats.worker_id)
+        .order_by(models.WorkerCompletionStats.completed.desc(), models.WorkerCompletionStats.worker_id)
+        .limit(limit)
+    )
+    return [dict(row._mapping) for row in result]
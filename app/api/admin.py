@@ -0,0 +1,110 @@
+from datetime import date, datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Tuple
+from ..analytics import get_daily_stats, get_status_counts, get_worker_stats
+from ..auth import require_role
+from ..config import settings
+from ..database import get_async_db
+from ..models import User
+from ..profiling import profiler
+from ..schemas import DailyCategoryStats, MarketplaceStats, WorkerStats
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+DEFAULT_RANGE_DAYS = 30
+
+def date_range(start: Optional[date], end: Optional[date]) -> Tuple[date, date]:
+    end = end or datetime.now(timezone.utc).date()
+    start = start or end - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return start, end
+
+@router.get("/stats", response_model=MarketplaceStats)
+async def get_stats(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    current_user: User = Depends(require_role("admin")),
+    db: AsyncSession = Depends(get_async_db)
+):
+    start, end = date_range(start, end)
+    daily = await get_daily_stats(db, start, end)
+    revenue_by_category = {}
+    for row in daily:
+        revenue_by_category[row["category"]] = revenue_by_category.get(row["category"], 0.0) + row["revenue"]
+    
+    return {
+        "start": start,
+        "end": end,
+        "status_counts": await get_status_counts(db),
+        "orders_created": sum(row["orders_created"] for row in daily),
+        "orders_paid": sum(row["orders_paid"] for row in daily),
+        "revenue": sum(row["revenue"] for row in daily),
+        "revenue_by_category": revenue_by_category
+    }
+
+@router.get("/stats/daily", response_model=List[DailyCategoryStats])
+async def get_daily(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    category: Optional[str] = None,
+    current_user: User = Depends(require_role("admin")),
+    db: AsyncSession = Depends(get_async_db)
+):
+    start, end = date_range(start, end)
+    return await get_daily_stats(db, start, end, category=category)
+
+@router.get("/stats/workers", response_model=List[WorkerStats])
+async def get_workers(
+    limit: int = Query(20, ge=1, le=500),
+    current_user: User = Depends(require_role("admin")),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await get_worker_stats(db, limit=limit)
+
+def profiling_allowed(current_user: User = Depends(require_role("admin"))) -> User:
+    # The middleware is only installed when the setting is on at startup
+    if not settings.profiling_enabled:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    return current_user
+
+@router.get("/profiling")
+def get_profiling_status(current_user: User = Depends(profiling_allowed)):
+    return profiler.status()
+
+@router.post("/profiling/start")
+def start_profiling(
+    sample_rate: Optional[float] = Query(None, gt=0, le=1),
+    current_user: User = Depends(profiling_allowed)
+):
+    profiler.start(sample_rate)
+    return profiler.status()
+
+@router.post("/profiling/stop")
+def stop_profiling(current_user: User = Depends(profiling_allowed)):
+    profiler.stop()
+    return profiler.status()
+
+@router.delete("/profiling")
+def reset_profiling(current_user: User = Depends(profiling_allowed)):
+    profiler.reset()
+    return profiler.status()
+
+@router.get("/profiling/stacks", response_class=PlainTextResponse)
+def get_profiling_stacks(
+    route: Optional[str] = None,
+    current_user: User = Depends(profiling_allowed)
+):
+    return PlainTextResponse(
+        profiler.collapsed(route),
+        headers={"Content-Disposition": 'attachment; filename="profile.collapsed"'}
+    )
+
+@router.get("/profiling/sql")
+def get_profiling_sql(
+    route: Optional[str] = None,
+    current_user: User = Depends(profiling_allowed)
+):
+    return profiler.sql(route)
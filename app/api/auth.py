@@ -1,30 +1,42 @@
 from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from ..database import get_db
-from ..auth import authenticate_user, create_access_token, get_current_active_user
-from ..crud import UserCRUD
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import get_async_db
+from ..auth import authenticate_user, create_user_access_token, get_current_active_user, principal_cache, require_role
+from ..crud import AsyncUserCRUD
 from ..schemas import User, UserCreate, Token
 from ..config import settings
+from ..ratelimit import limit_by_ip, limit_login_username
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
-@router.post("/register", response_model=User)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = UserCRUD.get_user_by_email(db, email=user.email)
+@router.post(
+    "/register",
+    response_model=User,
+    dependencies=[Depends(limit_by_ip("register_ip", settings.rate_limit_register_ip))]
+)
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await AsyncUserCRUD.get_user_by_email(db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    db_user = UserCRUD.get_user_by_username(db, username=user.username)
+    db_user = await AsyncUserCRUD.get_user_by_username(db, username=user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already taken")
     
-    return UserCRUD.create_user(db=db, user=user)
+    return await AsyncUserCRUD.create_user(db=db, user=user)
 
-@router.post("/token", response_model=Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
+@router.post(
+    "/token",
+    response_model=Token,
+    dependencies=[
+        Depends(limit_by_ip("login_ip", settings.rate_limit_login_ip)),
+        Depends(limit_login_username)
+    ]
+)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -33,11 +45,13 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
         )
     
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
-    access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
+    access_token = create_user_access_token(user, expires_delta=access_token_expires)
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=User)
 def read_users_me(current_user: User = Depends(get_current_active_user)):
     return current_user
+
+@router.get("/cache-stats")
+def principal_cache_stats(current_user: User = Depends(require_role("admin"))):
+    return principal_cache.stats()
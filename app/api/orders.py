@@ -1,66 +1,155 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
-from ..database import get_db
+from typing import List, Optional
+from ..config import settings
+from ..database import get_async_db, get_db
 from ..auth import get_current_active_user, require_role
-from ..crud import OrderCRUD, ServiceCRUD
-from ..schemas import Order, OrderCreate, OrderUpdate, OrderWithDetails
+from ..crud import AsyncOrderCRUD, AsyncServiceCRUD, OrderCRUD
+from ..idempotency import IdempotentRequest, idempotent_request, run_idempotent
+from ..schemas import Order, OrderCreate, OrderEvent, OrderUpdate, OrderWithDetails
+from .. import models
 from ..models import User, UserRole, OrderStatus
-from ..websocket_manager import manager
 from ..payment import PaymentService
+from ..ratelimit import limit_by_user
+from ..serialization import RowSerializer
+from ..streaming import FORMATS, export_response
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
-@router.post("/", response_model=Order)
+order_list_serializer = RowSerializer(OrderWithDetails, many=True)
+
+@router.post(
+    "/",
+    response_model=Order,
+    dependencies=[Depends(limit_by_user("orders_user", settings.rate_limit_orders_user))]
+)
 async def create_order(
     order: OrderCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
+    idempotency: Optional[IdempotentRequest] = Depends(idempotent_request)
 ):
     if current_user.role != UserRole.CLIENT:
         raise HTTPException(status_code=403, detail="Only clients can create orders")
     
-    service = ServiceCRUD.get_service(db, service_id=order.service_id)
+    return await run_idempotent(idempotency, db, lambda commit: _create_order(order, current_user, db, commit), Order)
+
+async def _create_order(order: OrderCreate, current_user: User, db: AsyncSession, commit: bool):
+    service = await AsyncServiceCRUD.get_service(db, service_id=order.service_id)
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
     
     if not service.is_active:
         raise HTTPException(status_code=400, detail="Service is not available")
     
-    db_order = OrderCRUD.create_order(
+    db_order = await AsyncOrderCRUD.create_order(
         db=db, 
         order=order, 
         client_id=current_user.id, 
-        service_price=service.price
+        service=service,
+        commit=commit
     )
     
-    await manager.notify_new_order({
-        "id": db_order.id,
-        "service_name": service.name,
-        "category": service.category,
-        "total_amount": db_order.total_amount
-    })
-    
     return db_order
 
+@router.post("/claim-next", response_model=Order)
+async def claim_next_order(
+    category: Optional[str] = None,
+    current_user: User = Depends(require_role("worker")),
+    db: AsyncSession = Depends(get_async_db)
+):
+    order = await AsyncOrderCRUD.claim_next_order(db, worker=current_user, category=category)
+    if order is None:
+        raise HTTPException(status_code=404, detail="No open orders available")
+    
+    return order
+
 @router.get("/", response_model=List[OrderWithDetails])
 def get_orders(
-    skip: int = 0,
-    limit: int = 100,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=100),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     if current_user.role == UserRole.CLIENT:
-        orders = OrderCRUD.get_orders_by_client(db, client_id=current_user.id)
+        filters = {"client_id": current_user.id}
     elif current_user.role == UserRole.WORKER:
-        orders = OrderCRUD.get_orders_by_worker(db, worker_id=current_user.id)
+        filters = {"worker_id": current_user.id}
     elif current_user.role == UserRole.ADMIN:
-        orders = OrderCRUD.get_all_orders(db, skip=skip, limit=limit)
+        filters = {}
     else:
         raise HTTPException(status_code=403, detail="Invalid user role")
     
+    try:
+        if settings.fast_serialization:
+            keys, rows, next_cursor = OrderCRUD.get_order_rows_page(db, cursor=cursor, limit=limit, **filters)
+        else:
+            orders, next_cursor = OrderCRUD.get_orders_page(db, cursor=cursor, limit=limit, **filters)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    if settings.fast_serialization:
+        return Response(
+            content=order_list_serializer.render(keys, rows),
+            media_type="application/json",
+            headers={"X-Next-Cursor": next_cursor} if next_cursor else None
+        )
+    
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return orders
 
+@router.get("/export")
+def export_orders(
+    format: str = Query("ndjson", pattern="^(" + "|".join(FORMATS) + ")$"),
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    status: Optional[OrderStatus] = None,
+    current_user: User = Depends(require_role("admin"))
+):
+    query = select(
+        models.Order.id,
+        models.Order.client_id,
+        models.Order.worker_id,
+        models.Order.service_id,
+        models.Order.status,
+        models.Order.total_amount,
+        models.Order.payment_intent_id,
+        models.Order.created_at,
+        models.Order.updated_at
+    ).order_by(models.Order.id)
+    if created_from is not None:
+        query = query.where(models.Order.created_at >= created_from)
+    if created_to is not None:
+        query = query.where(models.Order.created_at < created_to)
+    if status is not None:
+        query = query.where(models.Order.status == status)
+    return export_response(query, format, "orders", settings.export_batch_size)
+
+# Declared before /{order_id} so "events" and "export" are not parsed as order ids
+@router.get("/events", response_model=List[OrderEvent])
+async def get_order_events(
+    after: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Replays notifications missed while disconnected; seq is the WebSocket message's seq
+    if current_user.role == UserRole.ADMIN:
+        events = await AsyncOrderCRUD.get_order_events(db, after=after, limit=limit)
+    else:
+        events = await AsyncOrderCRUD.get_order_events(
+            db, after=after, limit=limit, role=f"{current_user.role.value}s", user_id=current_user.id
+        )
+    return [
+        {"seq": event.id, "type": event.type, "data": event.payload, "created_at": event.created_at}
+        for event in events
+    ]
+
 @router.get("/{order_id}", response_model=OrderWithDetails)
 def get_order(
     order_id: int,
@@ -83,22 +172,16 @@ def get_order(
 async def accept_order(
     order_id: int,
     current_user: User = Depends(require_role("worker")),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    order = OrderCRUD.get_order(db, order_id=order_id)
+    order = await AsyncOrderCRUD.claim_order(db, order_id=order_id, worker=current_user)
     if order is None:
-        raise HTTPException(status_code=404, detail="Order not found")
-    
-    if order.worker_id is not None:
-        raise HTTPException(status_code=400, detail="Order already assigned")
-    
-    order.worker_id = current_user.id
-    db.commit()
-    
-    await manager.notify_order_accepted({
-        "id": order.id,
-        "worker_username": current_user.username
-    }, order.client_id)
+        order = await AsyncOrderCRUD.get_order(db, order_id=order_id)
+        if order is None:
+            raise HTTPException(status_code=404, detail="Order not found")
+        if order.worker_id is None:
+            raise HTTPException(status_code=409, detail=f"Order is {order.status.value}, not open for assignment")
+        raise HTTPException(status_code=409, detail="Order already assigned")
     
     return {"message": "Order accepted successfully"}
 
@@ -118,7 +201,13 @@ def complete_order(
     if order.status != OrderStatus.PAID:
         raise HTTPException(status_code=400, detail="Order must be paid before completion")
     
-    order.status = OrderStatus.COMPLETED
+    # Only one of several concurrent completions gets past the conditional update
+    if OrderCRUD.transition_order(db, order.id, OrderStatus.PAID, OrderStatus.COMPLETED) is None:
+        db.rollback()
+        db.refresh(order)
+        if order.status != OrderStatus.COMPLETED:
+            raise HTTPException(status_code=400, detail="Order must be paid before completion")
+        return {"message": "Order completed successfully"}
     db.commit()
     
     return {"message": "Order completed successfully"}
@@ -127,9 +216,13 @@ def complete_order(
 async def create_payment(
     order_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
+    idempotency: Optional[IdempotentRequest] = Depends(idempotent_request)
 ):
-    order = OrderCRUD.get_order(db, order_id=order_id)
+    return await run_idempotent(idempotency, db, lambda commit: _create_payment(order_id, current_user, db, commit))
+
+async def _create_payment(order_id: int, current_user: User, db: AsyncSession, commit: bool):
+    order = await AsyncOrderCRUD.get_order(db, order_id=order_id)
     if order is None:
         raise HTTPException(status_code=404, detail="Order not found")
     
@@ -139,57 +232,36 @@ async def create_payment(
     if order.status != OrderStatus.PENDING:
         raise HTTPException(status_code=400, detail="Order is not in pending status")
     
-    payment_data = PaymentService.create_payment_intent(order, db)
-    
-    await manager.notify_payment_status({
-        "id": order.id,
-        "status": "payment_created"
-    }, order.client_id)
-    
-    return payment_data
+    return await PaymentService.create_payment_intent(order, db, commit=commit)
 
 @router.post("/{order_id}/payment/confirm")
 async def confirm_payment(
     order_id: int,
     payment_intent_id: str,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    order = OrderCRUD.get_order(db, order_id=order_id)
+    order = await AsyncOrderCRUD.get_order(db, order_id=order_id)
     if order is None:
         raise HTTPException(status_code=404, detail="Order not found")
     
     if order.client_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to confirm payment for this order")
     
-    result = PaymentService.confirm_payment(payment_intent_id, db)
-    
-    await manager.notify_payment_status({
-        "id": order.id,
-        "status": "paid"
-    }, order.client_id)
-    
-    return result
+    return await PaymentService.confirm_payment(order_id, payment_intent_id, db)
 
 @router.post("/{order_id}/payment/cancel")
 async def cancel_payment(
     order_id: int,
     payment_intent_id: str,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    order = OrderCRUD.get_order(db, order_id=order_id)
+    order = await AsyncOrderCRUD.get_order(db, order_id=order_id)
     if order is None:
         raise HTTPException(status_code=404, detail="Order not found")
     
     if order.client_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to cancel payment for this order")
     
-    result = PaymentService.cancel_payment(payment_intent_id, db)
-    
-    await manager.notify_payment_status({
-        "id": order.id,
-        "status": "canceled"
-    }, order.client_id)
-    
-    return result
+    return await PaymentService.cancel_payment(order_id, payment_intent_id, db)
@@ -1,40 +1,121 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
-from ..database import get_db
+from typing import List, Optional
+from ..config import settings
+from ..database import get_async_db, get_db
 from ..auth import get_current_active_user, require_role
-from ..crud import ServiceCRUD
-from ..schemas import Service, ServiceCreate
+from ..catalog_cache import (
+    cached_response,
+    catalog_cache,
+    get_or_render,
+    service_adapter,
+    service_list_adapter,
+    service_list_serializer,
+    service_serializer
+)
+from ..crud import AsyncServiceCRUD, ServiceCRUD
+from ..schemas import Service, ServiceCreate, ServiceSearchResult
+from ..search import SORT_OPTIONS, search_services
+from ..streaming import FORMATS, bulk_import, export_response, read_records, request_format
+from .. import models
 from ..models import User
 
 router = APIRouter(prefix="/services", tags=["services"])
 
 @router.get("/", response_model=List[Service])
-def get_services(
+async def get_services(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    services = ServiceCRUD.get_services(db, skip=skip, limit=limit)
-    return services
+    entry = await get_or_render(
+        ("page", skip, limit),
+        lambda: AsyncServiceCRUD.get_services(db, skip=skip, limit=limit),
+        service_list_adapter,
+        lambda: AsyncServiceCRUD.get_service_rows(db, skip=skip, limit=limit),
+        service_list_serializer
+    )
+    return cached_response(request, entry)
 
 @router.get("/category/{category}", response_model=List[Service])
-def get_services_by_category(
+async def get_services_by_category(
+    request: Request,
     category: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
+):
+    entry = await get_or_render(
+        ("category", category),
+        lambda: AsyncServiceCRUD.get_services_by_category(db, category=category),
+        service_list_adapter,
+        lambda: AsyncServiceCRUD.get_service_rows_by_category(db, category=category),
+        service_list_serializer
+    )
+    return cached_response(request, entry)
+
+@router.get("/search", response_model=ServiceSearchResult)
+async def search(
+    q: Optional[str] = None,
+    category: Optional[str] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    sort: str = Query("relevance", pattern="^(" + "|".join(SORT_OPTIONS) + ")$"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    services = ServiceCRUD.get_services_by_category(db, category=category)
-    return services
+    return await search_services(
+        db,
+        q=q,
+        category=category,
+        min_price=min_price,
+        max_price=max_price,
+        sort=sort,
+        skip=skip,
+        limit=limit
+    )
+
+# Declared before /{service_id} so "export" is not parsed as a service id
+@router.get("/export")
+def export_services(
+    format: str = Query("ndjson", pattern="^(" + "|".join(FORMATS) + ")$"),
+    category: Optional[str] = None,
+    include_inactive: bool = False,
+    current_user: User = Depends(require_role("admin"))
+):
+    query = select(
+        models.Service.id,
+        models.Service.name,
+        models.Service.description,
+        models.Service.price,
+        models.Service.category,
+        models.Service.is_active,
+        models.Service.created_at
+    ).order_by(models.Service.id)
+    if category is not None:
+        query = query.where(models.Service.category == category)
+    if not include_inactive:
+        query = query.where(models.Service.is_active == True)
+    return export_response(query, format, "services", settings.export_batch_size)
 
 @router.get("/{service_id}", response_model=Service)
-def get_service(
+async def get_service(
+    request: Request,
     service_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    service = ServiceCRUD.get_service(db, service_id=service_id)
-    if service is None:
+    entry = await get_or_render(
+        ("service", service_id),
+        lambda: AsyncServiceCRUD.get_service(db, service_id=service_id),
+        service_adapter,
+        lambda: AsyncServiceCRUD.get_service_row(db, service_id=service_id),
+        service_serializer
+    )
+    if entry is None:
         raise HTTPException(status_code=404, detail="Service not found")
-    return service
+    return cached_response(request, entry)
 
 @router.post("/", response_model=Service)
 def create_service(
@@ -42,7 +123,36 @@ def create_service(
     current_user: User = Depends(require_role("admin")),
     db: Session = Depends(get_db)
 ):
-    return ServiceCRUD.create_service(db=db, service=service)
+    db_service = ServiceCRUD.create_service(db=db, service=service)
+    catalog_cache.invalidate()
+    return db_service
+
+@router.post("/bulk")
+async def bulk_create_services(
+    request: Request,
+    current_user: User = Depends(require_role("admin")),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Body is NDJSON (one service per line) or CSV with a header row, read as it streams in
+    fmt = request_format(request)
+    
+    async def insert(rows: List[dict]):
+        try:
+            await AsyncServiceCRUD.bulk_create_services(db, rows)
+        except Exception:
+            await db.rollback()
+            raise
+    
+    result = await bulk_import(
+        read_records(request, fmt),
+        ServiceCreate,
+        insert,
+        chunk_size=settings.bulk_import_chunk_size,
+        max_errors=settings.bulk_import_max_errors
+    )
+    if result["inserted"]:
+        catalog_cache.invalidate()
+    return result
 
 @router.put("/{service_id}", response_model=Service)
 def update_service(
@@ -60,6 +170,7 @@ def update_service(
     
     db.commit()
     db.refresh(db_service)
+    catalog_cache.invalidate()
     return db_service
 
 @router.delete("/{service_id}")
@@ -74,4 +185,5 @@ def delete_service(
     
     service.is_active = False
     db.commit()
+    catalog_cache.invalidate()
     return {"message": "Service deactivated successfully"}
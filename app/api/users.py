@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from ..config import settings
 from ..database import get_db
-from ..auth import require_role, get_current_active_user
+from ..auth import require_role, get_current_active_user, invalidate_principal
 from ..crud import UserCRUD
 from ..schemas import User, UserUpdate
+from .. import models
 from ..models import UserRole
+from ..streaming import FORMATS, export_response
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -19,6 +24,34 @@ def get_users(
     users = UserCRUD.get_users(db, skip=skip, limit=limit)
     return users
 
+# Declared before /{user_id} so "export" is not parsed as a user id
+@router.get("/export")
+def export_users(
+    format: str = Query("ndjson", pattern="^(" + "|".join(FORMATS) + ")$"),
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    role: Optional[UserRole] = None,
+    is_active: Optional[bool] = None,
+    current_user: User = Depends(require_role("admin"))
+):
+    query = select(
+        models.User.id,
+        models.User.email,
+        models.User.username,
+        models.User.role,
+        models.User.is_active,
+        models.User.created_at
+    ).order_by(models.User.id)
+    if created_from is not None:
+        query = query.where(models.User.created_at >= created_from)
+    if created_to is not None:
+        query = query.where(models.User.created_at < created_to)
+    if role is not None:
+        query = query.where(models.User.role == role)
+    if is_active is not None:
+        query = query.where(models.User.is_active == is_active)
+    return export_response(query, format, "users", settings.export_batch_size)
+
 @router.get("/{user_id}", response_model=User)
 def get_user(
     user_id: int,
@@ -57,4 +90,5 @@ def delete_user(
     
     user.is_active = False
     db.commit()
+    invalidate_principal(user.id)
     return {"message": "User deactivated successfully"}
@@ -0,0 +1,34 @@
+import json
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..config import settings
+from ..database import get_async_db
+from ..payment_events import payment_processor
+from ..payment_gateway import GatewayError, verify_webhook_signature
+
+router = APIRouter(prefix="/webhooks", tags=["webhooks"])
+
+@router.post("/stripe")
+async def stripe_webhook(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db)
+):
+    payload = await request.body()
+    try:
+        verify_webhook_signature(
+            payload,
+            request.headers.get("stripe-signature"),
+            settings.stripe_webhook_secret,
+            settings.stripe_webhook_tolerance
+        )
+        event = json.loads(payload)
+    except (GatewayError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid webhook: {str(e)}")
+    
+    # The id is the deduplication key, so without a usable one the event cannot be stored
+    if not isinstance(event, dict) or not isinstance(event.get("id"), str) or not isinstance(event.get("type"), str):
+        raise HTTPException(status_code=400, detail="Invalid webhook: not an event")
+    
+    # Acknowledge as soon as the event is stored; it is applied in the background
+    created = await payment_processor.record(db, event)
+    return {"received": True, "duplicate": not created}
@@ -1,32 +1,35 @@
+from typing import Optional
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException
 from ..websocket_manager import manager
-from ..auth import get_current_user_from_token
-from ..models import UserRole
+from ..auth import get_current_user_from_token, require_role
+from ..models import User, UserRole
 
 router = APIRouter()
 
-@router.websocket("/ws/{user_type}/{user_id}")
-async def websocket_endpoint(
-    websocket: WebSocket,
-    user_type: str,
-    user_id: int
-):
-    if user_type not in ["clients", "workers", "admins"]:
-        await websocket.close(code=4000, reason="Invalid user type")
-        return
-    
-    await manager.connect(websocket, user_type, user_id)
-    
+async def receive_loop(websocket: WebSocket, user_type: str):
     try:
         while True:
             data = await websocket.receive_text()
+            if manager.handle_client_message(websocket, data):
+                continue
             await manager.send_personal_message({
                 "type": "message",
                 "content": f"Message received: {data}"
             }, websocket)
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket, user_type)
 
+@router.get("/ws/stats")
+def websocket_stats(current_user: User = Depends(require_role("admin"))):
+    return {
+        "connections": manager.connection_counts(),
+        "queue_depths": manager.queue_depths(),
+        "rejected": manager.rejected,
+        "reaped": manager.reaped
+    }
+
 @router.websocket("/ws/auth/{token}")
 async def websocket_auth_endpoint(
     websocket: WebSocket,
@@ -34,19 +37,36 @@ async def websocket_auth_endpoint(
 ):
     try:
         user = await get_current_user_from_token(token)
-        user_type = f"{user.role.value}s"
-        
-        await manager.connect(websocket, user_type, user.id)
-        
-        try:
-            while True:
-                data = await websocket.receive_text()
-                await manager.send_personal_message({
-                    "type": "message",
-                    "content": f"Message received: {data}"
-                }, websocket)
-        except WebSocketDisconnect:
-            manager.disconnect(websocket, user_type)
-            
     except Exception as e:
         await websocket.close(code=4001, reason="Authentication failed")
+        return
+
+    user_type = f"{user.role.value}s"
+    if await manager.connect(websocket, user_type, user.id):
+        await receive_loop(websocket, user_type)
+
+@router.websocket("/ws/{user_type}/{user_id}")
+async def websocket_endpoint(
+    websocket: WebSocket,
+    user_type: str,
+    user_id: int,
+    token: Optional[str] = None
+):
+    # Targeted order and payment notifications go to every socket registered under
+    # a user id, so the path alone is not trusted: ?token= must belong to that user
+    if user_type not in ["clients", "workers", "admins"]:
+        await websocket.close(code=4000, reason="Invalid user type")
+        return
+
+    try:
+        user = await get_current_user_from_token(token or "")
+    except Exception as e:
+        await websocket.close(code=4001, reason="Authentication failed")
+        return
+
+    if user.id != user_id or f"{user.role.value}s" != user_type:
+        await websocket.close(code=4003, reason="Token does not match user")
+        return
+
+    if await manager.connect(websocket, user_type, user_id):
+        await receive_loop(websocket, user_type)
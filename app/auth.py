@@ -1,18 +1,24 @@
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from .database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .database import AsyncSessionLocal
 from .models import User
+from . import schemas
 from .schemas import TokenData
 from .config import settings
+from .cache import TTLCache
+from .hashing import pwd_context, verify_and_update_password
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# user id -> schemas.User snapshot of the caller. Entries are dropped when the
+# user is updated or deactivated; the TTL bounds staleness across processes.
+principal_cache = TTLCache(maxsize=settings.principal_cache_size, ttl=settings.principal_cache_ttl)
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -29,59 +35,128 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
     return encoded_jwt
 
+def create_user_access_token(user, expires_delta: Optional[timedelta] = None):
+    return create_access_token(
+        data={
+            "sub": user.username,
+            "user_id": user.id,
+            "role": user.role.value,
+            "is_active": user.is_active,
+        },
+        expires_delta=expires_delta
+    )
+
 def verify_token(token: str, credentials_exception):
     try:
         payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-        token_data = TokenData(username=username)
-    except JWTError:
+        token_data = TokenData(
+            username=username,
+            user_id=payload.get("user_id"),
+            role=payload.get("role"),
+            is_active=payload.get("is_active")
+        )
+    except (JWTError, ValueError):
         raise credentials_exception
     return token_data
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_principal(token_data: TokenData) -> Optional[schemas.User]:
+    if token_data.user_id is not None:
+        principal = principal_cache.get(token_data.user_id)
+        if principal is not None:
+            return principal
+
+    async with AsyncSessionLocal() as db:
+        if token_data.user_id is not None:
+            user = await db.get(User, token_data.user_id)
+        else:
+            # Tokens issued before user_id was added to the claims
+            result = await db.execute(select(User).where(User.username == token_data.username))
+            user = result.scalars().first()
+    if user is None:
+        return None
+
+    principal = schemas.User.model_validate(user)
+    principal_cache.set(principal.id, principal)
+    return principal
+
+def invalidate_principal(user_id: int):
+    principal_cache.invalidate(user_id)
+
+async def get_token_data(token: str = Depends(oauth2_scheme)) -> TokenData:
+    # Resolved once per request and shared by the dependencies below
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    token_data = verify_token(token, credentials_exception)
-    user = db.query(User).filter(User.username == token_data.username).first()
+    return verify_token(token, credentials_exception)
+
+async def get_current_user(token_data: TokenData = Depends(get_token_data)):
+    # Fast path: the claims can reject a caller without resolving the principal.
+    # They only ever deny; access is granted from the principal, so role and
+    # deactivation changes still apply within principal_cache_ttl.
+    if token_data.is_active is False:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    user = await get_principal(token_data)
     if user is None:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
-async def get_current_user_from_token(token: str, db: Session = Depends(get_db)):
+async def get_current_user_from_token(token: str):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
     )
     token_data = verify_token(token, credentials_exception)
-    user = db.query(User).filter(User.username == token_data.username).first()
+    user = await get_principal(token_data)
     if user is None:
         raise credentials_exception
     return user
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = db.query(User).filter(User.username == username).first()
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    result = await db.execute(select(User).where(User.username == username))
+    user = result.scalars().first()
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    verified, new_hash = await verify_and_update_password(password, user.hashed_password)
+    if not verified:
         return False
+    if new_hash:
+        # bcrypt cost changed since this hash was made; upgrade it transparently
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
-def get_current_active_user(current_user: User = Depends(get_current_user)):
+async def get_current_active_user(current_user: User = Depends(get_current_user)):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+def _forbidden() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="Not enough permissions"
+    )
+
 def require_role(required_role: str):
-    def role_checker(current_user: User = Depends(get_current_active_user)):
+    async def role_claim_checker(token_data: TokenData = Depends(get_token_data)):
+        # Declared before the principal so a wrong role claim is rejected first;
+        # tokens issued without the claim fall through to the principal check
+        if token_data.role is not None and token_data.role.value != required_role:
+            raise _forbidden()
+
+    async def role_checker(
+        _: None = Depends(role_claim_checker),
+        current_user: User = Depends(get_current_active_user)
+    ):
         if current_user.role.value != required_role:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Not enough permissions"
-            )
+            raise _forbidden()
         return current_user
     return role_checker
@@ -0,0 +1,162 @@
+import asyncio
+import glob
+import json
+import logging
+import os
+import socket
+import uuid
+from typing import Awaitable, Callable, Optional
+from sqlalchemy.engine import make_url
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], Awaitable[None]]
+
+class Backplane:
+    # Carries notifications between app processes. Every process subscribes with
+    # start() and fans received messages out to its own sockets.
+    async def start(self, handler: Handler):
+        raise NotImplementedError
+
+    async def publish(self, message: dict):
+        raise NotImplementedError
+
+    async def stop(self):
+        pass
+
+class InMemoryBackplane(Backplane):
+    def __init__(self):
+        self.handler: Optional[Handler] = None
+
+    async def start(self, handler: Handler):
+        self.handler = handler
+
+    async def publish(self, message: dict):
+        if self.handler is not None:
+            await self.handler(message)
+
+class PostgresBackplane(Backplane):
+    # LISTEN/NOTIFY on a single channel. NOTIFY payloads are limited to 8000 bytes,
+    # which comfortably fits order notifications.
+    def __init__(self, dsn: str, channel: str, reconnect_delay: float = 1.0):
+        self.dsn = dsn
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.handler: Optional[Handler] = None
+        self._listen_conn = None
+        self._publish_conn = None
+        self._publish_lock = asyncio.Lock()
+        self._closing = False
+
+    async def start(self, handler: Handler):
+        self.handler = handler
+        await self._listen()
+
+    async def _listen(self):
+        import asyncpg
+
+        self._listen_conn = await asyncpg.connect(self.dsn)
+        self._listen_conn.add_termination_listener(self._on_terminated)
+        await self._listen_conn.add_listener(self.channel, self._on_notify)
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            logger.warning("Ignoring malformed backplane payload on %s", channel)
+            return
+        asyncio.create_task(self.handler(message))
+
+    def _on_terminated(self, connection):
+        if not self._closing:
+            asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        while not self._closing:
+            try:
+                await self._listen()
+                return
+            except Exception:
+                logger.exception("Backplane listener reconnect failed")
+                await asyncio.sleep(self.reconnect_delay)
+
+    async def publish(self, message: dict):
+        import asyncpg
+
+        payload = json.dumps(message)
+        async with self._publish_lock:
+            if self._publish_conn is None or self._publish_conn.is_closed():
+                self._publish_conn = await asyncpg.connect(self.dsn)
+            await self._publish_conn.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+
+    async def stop(self):
+        self._closing = True
+        for conn in (self._listen_conn, self._publish_conn):
+            if conn is not None and not conn.is_closed():
+                await conn.close()
+
+class LocalSocketBackplane(Backplane):
+    # Stand-in for several processes on one host (tests, local multi-worker runs):
+    # each process binds a Unix datagram socket in a shared directory and
+    # publishing sends the message to every socket found there.
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = os.path.join(directory, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.sock")
+        self.handler: Optional[Handler] = None
+        self._sock: Optional[socket.socket] = None
+
+    async def start(self, handler: Handler):
+        self.handler = handler
+        os.makedirs(self.directory, exist_ok=True)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+        self._sock.bind(self.path)
+        asyncio.get_running_loop().add_reader(self._sock.fileno(), self._on_readable)
+
+    def _on_readable(self):
+        while True:
+            try:
+                data = self._sock.recv(65536)
+            except BlockingIOError:
+                return
+            try:
+                message = json.loads(data)
+            except ValueError:
+                logger.warning("Ignoring malformed backplane datagram")
+                continue
+            asyncio.create_task(self.handler(message))
+
+    async def publish(self, message: dict):
+        data = json.dumps(message).encode()
+        for path in glob.glob(os.path.join(self.directory, "*.sock")):
+            try:
+                self._sock.sendto(data, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Left behind by a process that exited without cleaning up
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            except BlockingIOError:
+                logger.warning("Backplane peer %s is not keeping up, dropping message", path)
+
+    async def stop(self):
+        if self._sock is not None:
+            asyncio.get_running_loop().remove_reader(self._sock.fileno())
+            self._sock.close()
+            self._sock = None
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+def create_backplane() -> Backplane:
+    if settings.ws_backplane == "postgres":
+        dsn = make_url(settings.database_url).set(drivername="postgresql")
+        return PostgresBackplane(dsn.render_as_string(hide_password=False), settings.ws_backplane_channel)
+    if settings.ws_backplane == "local":
+        return LocalSocketBackplane(settings.ws_backplane_socket_dir)
+    if settings.ws_backplane == "memory":
+        return InMemoryBackplane()
+    raise ValueError(f"Unknown WS_BACKPLANE: {settings.ws_backplane}")
@@ -0,0 +1,85 @@
+import hashlib
+from typing import Any, Callable, Hashable, List, Optional
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from .cache import TTLCache
+from .config import settings
+from .schemas import Service
+from .serialization import REFERENCE_PYDANTIC, RowSerializer
+
+service_adapter = TypeAdapter(Service)
+service_list_adapter = TypeAdapter(List[Service])
+service_serializer = RowSerializer(Service, reference=REFERENCE_PYDANTIC)
+service_list_serializer = RowSerializer(Service, many=True, reference=REFERENCE_PYDANTIC)
+
+class CachedBody:
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+class CatalogCache:
+    # Pre-serialized JSON for the public catalog endpoints. Every admin mutation
+    # bumps the version, which orphans all earlier entries at once; the TTL bounds
+    # how long other processes can keep serving a catalog they did not see change.
+    def __init__(self, maxsize: int, ttl: float):
+        self.version = 0
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, key: Hashable) -> Optional[CachedBody]:
+        return self._entries.get((self.version, key))
+
+    def set(self, key: Hashable, body: bytes) -> CachedBody:
+        entry = CachedBody(body)
+        self._entries.set((self.version, key), entry)
+        return entry
+
+    def invalidate(self):
+        self.version += 1
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"version": self.version, **self._entries.stats()}
+
+catalog_cache = CatalogCache(maxsize=settings.catalog_cache_size, ttl=settings.catalog_cache_ttl)
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in [tag.strip() for tag in if_none_match.split(",")]
+
+def cached_response(request: Request, entry: CachedBody) -> Response:
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+async def get_or_render(
+    key: Hashable,
+    load: Callable[[], Any],
+    adapter: TypeAdapter,
+    load_rows: Optional[Callable[[], Any]] = None,
+    serializer: Optional[RowSerializer] = None
+) -> Optional[CachedBody]:
+    # With fast_serialization, load_rows returns (keys, rows) from a column select
+    # and serializer renders the same bytes adapter would
+    entry = catalog_cache.get(key)
+    if entry is not None:
+        return entry
+    version = catalog_cache.version
+    if settings.fast_serialization and load_rows is not None:
+        keys, data = await load_rows()
+        if data is None:
+            return None
+        body = serializer.render(keys, data)
+    else:
+        data = await load()
+        if data is None:
+            return None
+        body = adapter.dump_json(adapter.validate_python(data, from_attributes=True))
+    if version != catalog_cache.version:
+        # Invalidated while we were loading; serve the result but do not cache it
+        return CachedBody(body)
+    return catalog_cache.set(key, body)
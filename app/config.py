@@ -3,11 +3,81 @@ from typing import Optional
 
 class Settings(BaseSettings):
     database_url: str = "sqlite:///./marketplace.db"
+    async_database_url: Optional[str] = None
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: int = 30
+    db_pool_pre_ping: bool = True
+    db_pool_recycle: int = 1800
     secret_key: str = "your-secret-key-here-change-in-production"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    bcrypt_rounds: int = 12
+    password_hash_workers: Optional[int] = None
+    password_hash_queue_size: int = 64
+    password_hash_retry_after: int = 1
+    rate_limit_enabled: bool = True
+    rate_limit_store: str = "memory"
+    rate_limit_shards: int = 16
+    rate_limit_max_keys: int = 100000
+    rate_limit_trust_forwarded: bool = False
+    rate_limit_login_ip: str = "20/minute"
+    rate_limit_login_username: str = "10/minute"
+    rate_limit_register_ip: str = "5/minute"
+    rate_limit_orders_user: str = "30/minute"
+    admission_max_concurrency: int = 256
+    admission_queue_size: int = 512
+    admission_queue_timeout: float = 1.0
+    admission_retry_after: int = 1
+    idempotency_ttl: int = 86400
+    idempotency_lock_timeout: int = 60
+    idempotency_cache_size: int = 10000
+    principal_cache_size: int = 10000
+    principal_cache_ttl: int = 60
+    ws_send_queue_size: int = 256
+    ws_overflow_policy: str = "drop_oldest"
+    ws_backplane: str = "memory"
+    ws_backplane_channel: str = "marketplace_ws"
+    ws_backplane_socket_dir: str = "/tmp/marketplace-ws"
+    ws_heartbeat_interval: float = 20
+    ws_heartbeat_timeout: float = 60
+    ws_idle_timeout: float = 0
+    ws_max_connections: int = 10000
+    ws_max_connections_per_user: int = 5
+    ws_new_order_window: float = 0.05
+    ws_new_order_max_batch: int = 100
+    catalog_cache_size: int = 1024
+    catalog_cache_ttl: int = 30
+    search_index_ttl: int = 300
+    outbox_batch_size: int = 100
+    outbox_poll_interval: float = 1.0
+    outbox_retention: int = 86400
+    bulk_import_chunk_size: int = 5000
+    bulk_import_max_errors: int = 1000
+    export_batch_size: int = 1000
+    analytics_rollup_shards: int = 8
+    fast_serialization: bool = False
+    metrics_enabled: bool = True
+    metrics_query_threshold: int = 25
+    profiling_enabled: bool = False
+    profiling_sample_rate: float = 0.01
+    profiling_interval: float = 0.005
     stripe_secret_key: str = "sk_test_your_stripe_test_key"
     stripe_publishable_key: str = "pk_test_your_stripe_test_key"
+    payment_gateway: str = "stripe"
+    payment_timeout: float = 10.0
+    payment_connect_timeout: float = 3.0
+    payment_max_retries: int = 2
+    payment_retry_backoff: float = 0.5
+    payment_max_connections: int = 20
+    payment_fake_latency: float = 0.0
+    stripe_webhook_secret: str = "whsec_your_webhook_secret"
+    stripe_webhook_tolerance: int = 300
+    payment_event_queue_size: int = 1000
+    payment_event_batch_size: int = 100
+    payment_reconcile_interval: float = 300
+    payment_reconcile_page_size: int = 100
+    payment_reconcile_lookback: int = 7 * 24 * 3600
     
     class Config:
         env_file = ".env"
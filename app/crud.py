@@ -1,8 +1,45 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import and_, insert, or_, select, text, update
 from . import models, schemas
-from .auth import get_password_hash
-from typing import List, Optional
+from .analytics import record_transitions, record_transitions_sync
+from .auth import get_password_hash, invalidate_principal
+from .hashing import hash_password
+from .outbox import add_order_event
+from .serialization import columns_for
+from typing import Dict, List, Optional, Tuple
+import base64
+
+def encode_cursor(order_id: int) -> str:
+    return base64.urlsafe_b64encode(f"o:{order_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        prefix, order_id = raw.split(":", 1)
+        if prefix != "o":
+            raise ValueError(cursor)
+        return int(order_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+SERVICE_COPY_COLUMNS = ("name", "description", "price", "category", "is_active")
+
+def _column_default(column: str):
+    # COPY skips SQLAlchemy's column defaults, so columns missing from a row take them from here
+    default = models.Service.__table__.c[column].default
+    return default.arg if default is not None and default.is_scalar else None
+
+SERVICE_COPY_DEFAULTS = {column: _column_default(column) for column in SERVICE_COPY_COLUMNS}
+
+def _transition_statement(order_id: int, from_status: models.OrderStatus, to_status: models.OrderStatus):
+    # populate_existing through from_statement refreshes an order the session already holds
+    return (
+        update(models.Order)
+        .where(models.Order.id == order_id, models.Order.status == from_status)
+        .values(status=to_status)
+        .returning(models.Order)
+    )
 
 class UserCRUD:
     @staticmethod
@@ -44,6 +81,7 @@ class UserCRUD:
                 setattr(db_user, field, value)
             db.commit()
             db.refresh(db_user)
+            invalidate_principal(user_id)
         return db_user
 
 class ServiceCRUD:
@@ -68,6 +106,12 @@ class ServiceCRUD:
         db.commit()
         db.refresh(db_service)
         return db_service
+    
+    @staticmethod
+    def bulk_create_services(db: Session, rows: List[dict]):
+        # A single executemany instead of one INSERT and refresh per service
+        db.execute(insert(models.Service.__table__), [{"is_active": True, **row} for row in rows])
+        db.commit()
 
 class OrderCRUD:
     @staticmethod
@@ -75,12 +119,94 @@ class OrderCRUD:
         return db.query(models.Order).filter(models.Order.id == order_id).first()
     
     @staticmethod
-    def get_orders_by_client(db: Session, client_id: int):
-        return db.query(models.Order).filter(models.Order.client_id == client_id).all()
+    def get_orders_by_client(db: Session, client_id: int, skip: int = 0, limit: int = 100):
+        return db.query(models.Order).filter(models.Order.client_id == client_id).offset(skip).limit(limit).all()
+    
+    @staticmethod
+    def get_orders_by_worker(db: Session, worker_id: int, skip: int = 0, limit: int = 100):
+        return db.query(models.Order).filter(models.Order.worker_id == worker_id).offset(skip).limit(limit).all()
     
     @staticmethod
-    def get_orders_by_worker(db: Session, worker_id: int):
-        return db.query(models.Order).filter(models.Order.worker_id == worker_id).all()
+    def _filter_orders_page(
+        query,
+        client_id: Optional[int] = None,
+        worker_id: Optional[int] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50
+    ):
+        if client_id is not None:
+            query = query.filter(models.Order.client_id == client_id)
+        if worker_id is not None:
+            query = query.filter(models.Order.worker_id == worker_id)
+        if cursor is not None:
+            # Keyset on (created_at, id). The boundary created_at is read back in SQL
+            # rather than re-bound, so SQLite's text timestamps compare consistently.
+            last_id = decode_cursor(cursor)
+            last_created_at = select(models.Order.created_at).where(
+                models.Order.id == last_id
+            ).scalar_subquery()
+            query = query.filter(or_(
+                models.Order.created_at < last_created_at,
+                and_(models.Order.created_at == last_created_at, models.Order.id < last_id)
+            ))
+        return query.order_by(
+            models.Order.created_at.desc(), models.Order.id.desc()
+        ).limit(limit + 1)
+    
+    @staticmethod
+    def get_orders_page(
+        db: Session,
+        client_id: Optional[int] = None,
+        worker_id: Optional[int] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50
+    ) -> Tuple[List[models.Order], Optional[str]]:
+        query = db.query(models.Order).options(
+            joinedload(models.Order.client),
+            joinedload(models.Order.worker),
+            joinedload(models.Order.service)
+        )
+        orders = OrderCRUD._filter_orders_page(query, client_id, worker_id, cursor, limit).all()
+        
+        next_cursor = None
+        if len(orders) > limit:
+            orders = orders[:limit]
+            next_cursor = encode_cursor(orders[-1].id)
+        return orders, next_cursor
+    
+    @staticmethod
+    def get_order_rows_page(
+        db: Session,
+        client_id: Optional[int] = None,
+        worker_id: Optional[int] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50
+    ) -> Tuple[List[str], list, Optional[str]]:
+        # Same page as get_orders_page as flat OrderWithDetails rows, for RowSerializer
+        client = models.User.__table__.alias("client")
+        worker = models.User.__table__.alias("worker")
+        service = models.Service.__table__.alias("service")
+        query = db.query(
+            *columns_for(schemas.OrderWithDetails, models.Order.__table__),
+            *columns_for(schemas.User, client, "client__"),
+            *columns_for(schemas.User, worker, "worker__"),
+            *columns_for(schemas.Service, service, "service__")
+        ).select_from(models.Order).outerjoin(
+            client, client.c.id == models.Order.client_id
+        ).outerjoin(
+            worker, worker.c.id == models.Order.worker_id
+        ).outerjoin(
+            service, service.c.id == models.Order.service_id
+        )
+        result = OrderCRUD._filter_orders_page(query, client_id, worker_id, cursor, limit)
+        keys = [column["name"] for column in result.column_descriptions]
+        rows = result.all()
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].id)
+        return keys, rows, next_cursor
     
     @staticmethod
     def get_orders_by_category(db: Session, category: str):
@@ -93,24 +219,293 @@ class OrderCRUD:
         return db.query(models.Order).offset(skip).limit(limit).all()
     
     @staticmethod
-    def create_order(db: Session, order: schemas.OrderCreate, client_id: int, service_price: float):
+    def transition_order(db: Session, order_id: int, from_status: models.OrderStatus, to_status: models.OrderStatus):
+        # Conditional update: of several concurrent callers only one moves the order
+        # out of from_status and gets it back, so the transition is recorded once.
+        # Returns None without writing when the order was not in from_status.
+        order = db.execute(
+            select(models.Order)
+            .from_statement(_transition_statement(order_id, from_status, to_status))
+            .execution_options(populate_existing=True)
+        ).scalars().first()
+        if order is not None:
+            record_transitions_sync(db, [(order, from_status, to_status)])
+        return order
+
+class AsyncUserCRUD:
+    @staticmethod
+    async def get_user(db: AsyncSession, user_id: int):
+        return await db.get(models.User, user_id)
+    
+    @staticmethod
+    async def get_user_by_email(db: AsyncSession, email: str):
+        result = await db.execute(select(models.User).where(models.User.email == email))
+        return result.scalars().first()
+    
+    @staticmethod
+    async def get_user_by_username(db: AsyncSession, username: str):
+        result = await db.execute(select(models.User).where(models.User.username == username))
+        return result.scalars().first()
+    
+    @staticmethod
+    async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100):
+        result = await db.execute(select(models.User).offset(skip).limit(limit))
+        return result.scalars().all()
+    
+    @staticmethod
+    async def create_user(db: AsyncSession, user: schemas.UserCreate):
+        hashed_password = await hash_password(user.password)
+        db_user = models.User(
+            email=user.email,
+            username=user.username,
+            hashed_password=hashed_password,
+            role=user.role
+        )
+        db.add(db_user)
+        await db.commit()
+        await db.refresh(db_user)
+        return db_user
+    
+    @staticmethod
+    async def update_user(db: AsyncSession, user_id: int, user_update: schemas.UserUpdate):
+        db_user = await db.get(models.User, user_id)
+        if db_user:
+            update_data = user_update.dict(exclude_unset=True)
+            for field, value in update_data.items():
+                setattr(db_user, field, value)
+            await db.commit()
+            await db.refresh(db_user)
+            invalidate_principal(user_id)
+        return db_user
+
+class AsyncServiceCRUD:
+    @staticmethod
+    async def get_service(db: AsyncSession, service_id: int):
+        return await db.get(models.Service, service_id)
+    
+    @staticmethod
+    async def get_services(db: AsyncSession, skip: int = 0, limit: int = 100):
+        result = await db.execute(
+            select(models.Service).where(models.Service.is_active == True).offset(skip).limit(limit)
+        )
+        return result.scalars().all()
+    
+    @staticmethod
+    async def get_services_by_category(db: AsyncSession, category: str):
+        result = await db.execute(select(models.Service).where(
+            and_(models.Service.category == category, models.Service.is_active == True)
+        ))
+        return result.scalars().all()
+    
+    @staticmethod
+    async def get_service_row(db: AsyncSession, service_id: int):
+        # Column-tuple variants of the reads above, for RowSerializer
+        result = await db.execute(
+            select(*columns_for(schemas.Service, models.Service.__table__)).where(models.Service.id == service_id)
+        )
+        return list(result.keys()), result.first()
+    
+    @staticmethod
+    async def get_service_rows(db: AsyncSession, skip: int = 0, limit: int = 100):
+        result = await db.execute(
+            select(*columns_for(schemas.Service, models.Service.__table__))
+            .where(models.Service.is_active == True).offset(skip).limit(limit)
+        )
+        return list(result.keys()), result.all()
+    
+    @staticmethod
+    async def get_service_rows_by_category(db: AsyncSession, category: str):
+        result = await db.execute(
+            select(*columns_for(schemas.Service, models.Service.__table__))
+            .where(and_(models.Service.category == category, models.Service.is_active == True))
+        )
+        return list(result.keys()), result.all()
+    
+    @staticmethod
+    async def create_service(db: AsyncSession, service: schemas.ServiceCreate):
+        db_service = models.Service(**service.dict())
+        db.add(db_service)
+        await db.commit()
+        await db.refresh(db_service)
+        return db_service
+    
+    @staticmethod
+    async def bulk_create_services(db: AsyncSession, rows: List[dict]):
+        # COPY on PostgreSQL, a batched executemany elsewhere; one transaction per call
+        if db.bind.dialect.name == "postgresql":
+            connection = await db.connection()
+            raw = await connection.get_raw_connection()
+            await raw.driver_connection.copy_records_to_table(
+                models.Service.__tablename__,
+                records=[tuple(row.get(column, SERVICE_COPY_DEFAULTS[column]) for column in SERVICE_COPY_COLUMNS) for row in rows],
+                columns=SERVICE_COPY_COLUMNS
+            )
+        else:
+            await db.execute(insert(models.Service.__table__), rows)
+        await db.commit()
+
+class AsyncOrderCRUD:
+    @staticmethod
+    async def get_order(db: AsyncSession, order_id: int):
+        return await db.get(models.Order, order_id)
+    
+    @staticmethod
+    async def get_order_by_payment_intent(db: AsyncSession, payment_intent_id: str):
+        result = await db.execute(
+            select(models.Order).where(models.Order.payment_intent_id == payment_intent_id)
+        )
+        return result.scalars().first()
+    
+    @staticmethod
+    async def get_orders_by_client(db: AsyncSession, client_id: int, skip: int = 0, limit: int = 100):
+        result = await db.execute(
+            select(models.Order).where(models.Order.client_id == client_id).offset(skip).limit(limit)
+        )
+        return result.scalars().all()
+    
+    @staticmethod
+    async def get_orders_by_worker(db: AsyncSession, worker_id: int, skip: int = 0, limit: int = 100):
+        result = await db.execute(
+            select(models.Order).where(models.Order.worker_id == worker_id).offset(skip).limit(limit)
+        )
+        return result.scalars().all()
+    
+    @staticmethod
+    async def get_all_orders(db: AsyncSession, skip: int = 0, limit: int = 100):
+        result = await db.execute(select(models.Order).offset(skip).limit(limit))
+        return result.scalars().all()
+    
+    @staticmethod
+    async def create_order(db: AsyncSession, order: schemas.OrderCreate, client_id: int, service: models.Service, commit: bool = True):
+        # commit=False leaves the order flushed for the caller to commit with its own writes
         db_order = models.Order(
             **order.dict(),
             client_id=client_id,
-            total_amount=service_price
+            total_amount=service.price
         )
         db.add(db_order)
-        db.commit()
-        db.refresh(db_order)
+        await db.flush()
+        await record_transitions(db, [(db_order, None, models.OrderStatus.PENDING)], {service.id: service.category})
+        add_order_event(db, db_order.id, "new_order", {
+            "id": db_order.id,
+            "service_name": service.name,
+            "category": service.category,
+            "total_amount": db_order.total_amount
+        }, "workers")
+        if commit:
+            await db.commit()
+        else:
+            await db.flush()
+        await db.refresh(db_order)
         return db_order
     
     @staticmethod
-    def update_order(db: Session, order_id: int, order_update: schemas.OrderUpdate):
-        db_order = db.query(models.Order).filter(models.Order.id == order_id).first()
-        if db_order:
-            update_data = order_update.dict(exclude_unset=True)
-            for field, value in update_data.items():
-                setattr(db_order, field, value)
-            db.commit()
-            db.refresh(db_order)
-        return db_order
+    async def claim_order(db: AsyncSession, order_id: int, worker: schemas.User):
+        # Conditional update: exactly one concurrent claimer matches the row
+        result = await db.execute(
+            update(models.Order)
+            .where(models.Order.id == order_id, text(models.OPEN_UNASSIGNED_ORDERS))
+            .values(worker_id=worker.id)
+            .returning(models.Order)
+            .execution_options(synchronize_session=False)
+        )
+        order = result.scalars().first()
+        if order is not None:
+            AsyncOrderCRUD._add_accepted_event(db, order, worker)
+        await db.commit()
+        return order
+    
+    @staticmethod
+    async def claim_next_order(db: AsyncSession, worker: schemas.User, category: Optional[str] = None):
+        # Oldest open order first. On PostgreSQL, SKIP LOCKED lets concurrent
+        # claimers pass over a row another transaction is taking instead of
+        # queueing behind it; SQLite serializes writers and ignores the clause.
+        candidate = select(models.Order.id).where(text(models.OPEN_UNASSIGNED_ORDERS))
+        if category is not None:
+            candidate = candidate.join(models.Service, models.Service.id == models.Order.service_id).where(
+                models.Service.category == category
+            )
+        candidate = (
+            candidate.order_by(models.Order.created_at, models.Order.id)
+            .limit(1)
+            .with_for_update(skip_locked=True, of=models.Order)
+        )
+        result = await db.execute(
+            update(models.Order)
+            .where(models.Order.id == candidate.scalar_subquery(), models.Order.worker_id.is_(None))
+            .values(worker_id=worker.id)
+            .returning(models.Order)
+            .execution_options(synchronize_session=False)
+        )
+        order = result.scalars().first()
+        if order is not None:
+            AsyncOrderCRUD._add_accepted_event(db, order, worker)
+        await db.commit()
+        return order
+    
+    @staticmethod
+    def _add_accepted_event(db: AsyncSession, order: models.Order, worker: schemas.User):
+        add_order_event(db, order.id, "order_accepted", {
+            "id": order.id,
+            "worker_username": worker.username
+        }, "clients", order.client_id)
+    
+    @staticmethod
+    async def apply_payment_statuses(db: AsyncSession, statuses: Dict[str, models.OrderStatus]):
+        # Moves still-pending orders to the status their payment intent reached,
+        # one UPDATE per target status through the payment_intent_id index
+        intents_by_status: Dict[models.OrderStatus, List[str]] = {}
+        for intent_id, status in statuses.items():
+            intents_by_status.setdefault(status, []).append(intent_id)
+        orders = []
+        for status, intent_ids in intents_by_status.items():
+            result = await db.execute(
+                update(models.Order)
+                .where(
+                    models.Order.payment_intent_id.in_(intent_ids),
+                    models.Order.status == models.OrderStatus.PENDING
+                )
+                .values(status=status)
+                .returning(models.Order)
+                .execution_options(synchronize_session=False)
+            )
+            orders.extend(result.scalars().all())
+        await record_transitions(db, [(order, models.OrderStatus.PENDING, order.status) for order in orders])
+        for order in orders:
+            add_order_event(db, order.id, "payment_status", {
+                "id": order.id,
+                "status": order.status.value
+            }, "clients", order.client_id)
+        await db.commit()
+        return orders
+    
+    @staticmethod
+    async def transition_order(db: AsyncSession, order_id: int, from_status: models.OrderStatus, to_status: models.OrderStatus):
+        # Async twin of OrderCRUD.transition_order; the caller adds events and commits
+        result = await db.execute(
+            select(models.Order)
+            .from_statement(_transition_statement(order_id, from_status, to_status))
+            .execution_options(populate_existing=True)
+        )
+        order = result.scalars().first()
+        if order is not None:
+            await record_transitions(db, [(order, from_status, to_status)])
+        return order
+    
+    @staticmethod
+    async def get_order_events(
+        db: AsyncSession,
+        after: int = 0,
+        limit: int = 100,
+        role: Optional[str] = None,
+        user_id: Optional[int] = None
+    ):
+        query = select(models.OrderEvent).where(models.OrderEvent.id > after)
+        if role is not None:
+            # Role-wide broadcasts plus events addressed to this user
+            query = query.where(
+                models.OrderEvent.role == role,
+                or_(models.OrderEvent.user_id.is_(None), models.OrderEvent.user_id == user_id)
+            )
+        result = await db.execute(query.order_by(models.OrderEvent.id).limit(limit))
+        return result.scalars().all()
@@ -1,10 +1,60 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from .config import settings
+from .metrics import instrument_engine, registry
+from .profiling import capture_statements
 
-engine = create_engine(settings.database_url)
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def get_async_database_url(database_url: str) -> str:
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend in ASYNC_DRIVERS:
+        url = url.set(drivername=ASYNC_DRIVERS[backend])
+    return url.render_as_string(hide_password=False)
+
+def engine_options(database_url: str) -> dict:
+    # SQLite uses a single-file/static pool, so sizing options do not apply there
+    if make_url(database_url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "pool_recycle": settings.db_pool_recycle,
+    }
+
+async_database_url = settings.async_database_url or get_async_database_url(settings.database_url)
+
+engine = create_engine(settings.database_url, **engine_options(settings.database_url))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+async_engine = create_async_engine(async_database_url, **engine_options(async_database_url))
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+if settings.profiling_enabled:
+    capture_statements(engine)
+    capture_statements(async_engine.sync_engine)
+
+def _pool_checked_out() -> dict:
+    # SQLite's pools do not track checkouts
+    return {
+        (name,): pool.checkedout()
+        for name, pool in (("sync", engine.pool), ("async", async_engine.sync_engine.pool))
+        if hasattr(pool, "checkedout")
+    }
+
+registry.gauge("db_pool_checked_out", "Connections currently checked out of the pool", ["engine"], _pool_checked_out)
+
 Base = declarative_base()
 
 def get_db():
@@ -13,3 +63,7 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,235 @@
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Optional, Tuple
+from fastapi import Depends, Header, HTTPException, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+from .auth import get_current_active_user
+from .cache import TTLCache
+from .config import settings
+from .database import AsyncSessionLocal
+from .metrics import registry
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+CLEANUP_INTERVAL = 300
+MAX_KEY_LENGTH = 255
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+# (request hash, status code, body) of completed requests
+StoredResponse = Tuple[str, int, Any]
+
+replayed_responses = registry.counter(
+    "idempotency_replayed_responses_total",
+    "Retries answered with a stored response",
+    ["source"]
+)
+
+class IdempotencyStore:
+    # Completed responses live in the idempotency_keys table until they expire,
+    # with an LRU front for the retries that arrive shortly after. They never
+    # change once written, so the per-process front cannot go stale.
+    def __init__(self, ttl: int, lock_timeout: int, cache_size: int):
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.cache = TTLCache(maxsize=cache_size, ttl=ttl)
+        self.task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.cleanup()
+            except Exception:
+                logger.exception("Idempotency key cleanup failed")
+            await asyncio.sleep(CLEANUP_INTERVAL)
+
+    async def cleanup(self):
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                delete(models.IdempotencyKey).where(models.IdempotencyKey.expires_at < datetime.now(timezone.utc))
+            )
+            await db.commit()
+
+idempotency_store = IdempotencyStore(
+    ttl=settings.idempotency_ttl,
+    lock_timeout=settings.idempotency_lock_timeout,
+    cache_size=settings.idempotency_cache_size
+)
+
+def _key_reused() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        detail="Idempotency-Key was already used for a different request"
+    )
+
+class IdempotentRequest:
+    def __init__(self, user_id: int, key: str, request_hash: str):
+        self.user_id = user_id
+        self.key = key
+        self.request_hash = request_hash
+
+    async def run(self, db: AsyncSession, handler: Callable[[bool], Awaitable[Any]], response_model=None):
+        # Replays the stored response, or claims the key and runs handler(commit=False),
+        # then commits its writes together with the stored response: a crash can
+        # not leave the order without its response for a later takeover to repeat.
+        # Requests that fail or are cancelled before that commit release the key.
+        replay = await self.begin(db)
+        if replay is not None:
+            return replay
+        saved = False
+        try:
+            result = await handler(False)
+            if response_model is not None:
+                result = response_model.model_validate(result)
+            body = jsonable_encoder(result)
+            await self.save(db, status.HTTP_200_OK, body)
+            saved = True
+            return body
+        finally:
+            if not saved:
+                await self.release(db)
+
+    async def begin(self, db: AsyncSession) -> Optional[JSONResponse]:
+        stored = idempotency_store.cache.get((self.user_id, self.key))
+        if stored is not None:
+            return self.replay(stored, "cache")
+
+        now = datetime.now(timezone.utc)
+        db.add(models.IdempotencyKey(
+            user_id=self.user_id,
+            key=self.key,
+            request_hash=self.request_hash,
+            created_at=now,
+            expires_at=now + timedelta(seconds=idempotency_store.ttl)
+        ))
+        try:
+            await db.commit()
+            return None
+        except IntegrityError:
+            await db.rollback()
+
+        # Take over keys that have expired but not been cleaned up yet, and claims
+        # left behind by a process that died mid-request
+        lock_cutoff = now - timedelta(seconds=idempotency_store.lock_timeout)
+        result = await db.execute(
+            update(models.IdempotencyKey)
+            .where(
+                models.IdempotencyKey.user_id == self.user_id,
+                models.IdempotencyKey.key == self.key,
+                or_(
+                    models.IdempotencyKey.expires_at < now,
+                    and_(models.IdempotencyKey.status_code.is_(None), models.IdempotencyKey.created_at < lock_cutoff)
+                )
+            )
+            .values(
+                request_hash=self.request_hash,
+                status_code=None,
+                response=None,
+                created_at=now,
+                expires_at=now + timedelta(seconds=idempotency_store.ttl)
+            )
+        )
+        await db.commit()
+        if result.rowcount:
+            return None
+
+        record = (await db.execute(
+            select(models.IdempotencyKey).where(
+                models.IdempotencyKey.user_id == self.user_id,
+                models.IdempotencyKey.key == self.key
+            )
+        )).scalar_one()
+        if record.request_hash != self.request_hash:
+            raise _key_reused()
+        if record.status_code is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is still being processed"
+            )
+        stored = (record.request_hash, record.status_code, record.response)
+        idempotency_store.cache.set((self.user_id, self.key), stored)
+        return self.replay(stored, "db")
+
+    def replay(self, stored: StoredResponse, source: str) -> JSONResponse:
+        request_hash, status_code, body = stored
+        if request_hash != self.request_hash:
+            raise _key_reused()
+        replayed_responses.inc((source,))
+        return JSONResponse(content=body, status_code=status_code, headers={REPLAYED_HEADER: "true"})
+
+    async def save(self, db: AsyncSession, status_code: int, body: Any):
+        # Commits whatever the handler left pending in the same transaction
+        await db.execute(
+            update(models.IdempotencyKey)
+            .where(models.IdempotencyKey.user_id == self.user_id, models.IdempotencyKey.key == self.key)
+            .values(status_code=status_code, response=body)
+        )
+        await db.commit()
+        idempotency_store.cache.set((self.user_id, self.key), (self.request_hash, status_code, body))
+
+    async def release(self, db: AsyncSession):
+        # Only an unfinished claim is deleted; if the commit in save() went through
+        # before a cancellation, the stored response stays. Shielded so a second
+        # cancellation does not leave the claim behind, and never raises over the
+        # request's own error.
+        async def delete_claim():
+            await db.rollback()
+            await db.execute(
+                delete(models.IdempotencyKey).where(
+                    models.IdempotencyKey.user_id == self.user_id,
+                    models.IdempotencyKey.key == self.key,
+                    models.IdempotencyKey.status_code.is_(None)
+                )
+            )
+            await db.commit()
+        try:
+            await asyncio.shield(delete_claim())
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.exception("Releasing Idempotency-Key %r failed", self.key)
+
+async def idempotent_request(
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    current_user: User = Depends(get_current_active_user)
+) -> Optional[IdempotentRequest]:
+    if idempotency_key is None:
+        return None
+    if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters"
+        )
+    # Same key with a different path or body is a client bug, not a retry
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(b"\0" + request.url.path.encode() + b"\0")
+    digest.update(await request.body())
+    return IdempotentRequest(current_user.id, idempotency_key, digest.hexdigest())
+
+async def run_idempotent(
+    idempotency: Optional[IdempotentRequest],
+    db: AsyncSession,
+    handler: Callable[[bool], Awaitable[Any]],
+    response_model=None
+):
+    # handler(commit) commits its own writes only when told to
+    if idempotency is None:
+        return await handler(True)
+    return await idempotency.run(db, handler, response_model)
@@ -1,8 +1,20 @@
 from fastapi import FastAPI, Depends
+from fastapi.responses import PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from .api import auth, users, services, orders, websocket
-from .database import engine
-from .models import Base
+from .api import admin, auth, users, services, orders, websocket, webhooks
+from .database import async_engine
+from .config import settings
+from .hashing import hashing_pool
+from .idempotency import idempotency_store
+from .metrics import MetricsMiddleware, registry
+from .profiling import ProfilingMiddleware, profiler
+from .ratelimit import AdmissionMiddleware
+from .migrations import run_migrations
+from .outbox import outbox_dispatcher
+from .payment_events import payment_processor
+from .payment_gateway import payment_gateway
+from .websocket_manager import manager
 
 app = FastAPI(
     title="Marketplace API",
@@ -10,17 +22,51 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Inside CORS so browsers can read the 503s it sends
+if settings.admission_max_concurrency:
+    app.add_middleware(
+        AdmissionMiddleware,
+        max_concurrency=settings.admission_max_concurrency,
+        queue_size=settings.admission_queue_size,
+        queue_timeout=settings.admission_queue_timeout,
+        retry_after=settings.admission_retry_after
+    )
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Retry-After", "Idempotent-Replayed"],
 )
 
+if settings.profiling_enabled:
+    app.add_middleware(ProfilingMiddleware)
+
+# Added last so it is outermost and times everything: profiling overhead, CORS and
+# the 503s admission control sends
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
 @app.on_event("startup")
 async def startup():
-    Base.metadata.create_all(bind=engine)
+    await run_in_threadpool(run_migrations)
+    await manager.start()
+    await payment_processor.start()
+    await outbox_dispatcher.start()
+    await idempotency_store.start()
+    profiler.install(app)
+
+@app.on_event("shutdown")
+async def shutdown():
+    await idempotency_store.stop()
+    await outbox_dispatcher.stop()
+    await payment_processor.stop()
+    await manager.stop()
+    await async_engine.dispose()
+    await payment_gateway.close()
+    hashing_pool.shutdown()
 
 @app.get("/")
 async def root():
@@ -31,6 +77,13 @@ async def root():
         "redoc": "/redoc"
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    # Prometheus text exposition format, per process
+    if not settings.metrics_enabled:
+        return PlainTextResponse("Metrics disabled\n", status_code=404)
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/api/")
 async def api_root():
     return {
@@ -43,7 +96,9 @@ async def api_root():
             "users": "/api/users/",
             "services": "/api/services/",
             "orders": "/api/orders/",
-            "websocket": "/api/ws/"
+            "websocket": "/api/ws/",
+            "webhooks": "/api/webhooks/",
+            "admin": "/api/admin/"
         }
     }
 
@@ -53,3 +108,5 @@ app.include_router(users.router, prefix="/api")
 app.include_router(services.router, prefix="/api")
 app.include_router(orders.router, prefix="/api")
 app.include_router(websocket.router, prefix="/api")
+app.include_router(webhooks.router, prefix="/api")
+app.include_router(admin.router, prefix="/api")
@@ -0,0 +1,238 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        # Observations come from the event loop and threadpool threads alike
+        self.lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self.values: Dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            values = sorted(self.values.items())
+        return [f"{self.name}{_labels(self.label_names, labels)} {_number(value)}" for labels, value in values]
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # labels -> per-bucket counts (last slot is +Inf), sum
+        self.values: Dict[tuple, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, labels: tuple, value: float):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            values = sorted((labels, (list(counts), total[0])) for labels, (counts, total) in self.values.items())
+        lines = []
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + ("+Inf" if bound == float("inf") else _number(bound)) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+class Gauge(Metric):
+    # Read at scrape time from collect(), which returns {label values: value}. Also
+    # used with type="counter" to expose totals that other objects already keep.
+    def __init__(self, name: str, help: str, labels: Sequence[str], collect: Callable[[], Dict[tuple, float]], type: str = "gauge"):
+        super().__init__(name, help, labels)
+        self.collect = collect
+        self.type = type
+
+    def samples(self) -> List[str]:
+        try:
+            values = sorted(self.collect().items())
+        except Exception:
+            logger.exception("Collecting gauge %s failed", self.name)
+            return []
+        return [f"{self.name}{_labels(self.label_names, labels)} {_number(value)}" for labels, value in values]
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        # Re-registering a name replaces it, so reloaded modules do not duplicate series
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str], collect: Callable[[], Dict[tuple, float]], type: str = "gauge") -> Gauge:
+        return self.register(Gauge(name, help, labels, collect, type))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+http_requests = registry.counter("http_requests_total", "HTTP requests by route and status", ["method", "route", "status"])
+http_duration = registry.histogram("http_request_duration_seconds", "HTTP request latency", ["method", "route"])
+http_queries = registry.histogram(
+    "http_request_db_queries",
+    "SQL statements issued per HTTP request",
+    ["method", "route"],
+    QUERY_COUNT_BUCKETS
+)
+http_db_duration = registry.histogram("http_request_db_seconds", "Time spent in SQL per HTTP request", ["method", "route"])
+query_duration = registry.histogram("db_query_duration_seconds", "SQL statement latency", ["route"])
+query_threshold_exceeded = registry.counter(
+    "http_request_query_threshold_exceeded_total",
+    "Requests that issued more than metrics_query_threshold SQL statements",
+    ["method", "route"]
+)
+
+class RequestStats:
+    __slots__ = ("scope", "queries", "db_time")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.queries = 0
+        self.db_time = 0.0
+
+# Set for the lifetime of each HTTP request; threadpool calls run in a copy of the
+# context, so sync routes and dependencies update the same RequestStats object
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_started")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    stats = current_request.get()
+    if stats is None:
+        # Outbox dispatcher, payment processor, startup
+        query_duration.observe(("background",), elapsed)
+        return
+    stats.queries += 1
+    stats.db_time += elapsed
+    query_duration.observe((route_name(stats.scope),), elapsed)
+
+def _handle_error(exception_context):
+    started = exception_context.connection.info.get("query_started") if exception_context.connection is not None else None
+    if started:
+        started.pop()
+
+def instrument_engine(engine: Engine):
+    # Async engines are instrumented through their .sync_engine
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+def route_name(scope: dict) -> str:
+    # The matched route's template keeps label cardinality bounded
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+class MetricsMiddleware:
+    # Pure ASGI rather than BaseHTTPMiddleware, so streaming responses are not
+    # buffered and the timing covers the full body
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request.reset(token)
+            self.record(scope, status_code, time.perf_counter() - started, stats)
+
+    @staticmethod
+    def record(scope: dict, status_code: int, elapsed: float, stats: RequestStats):
+        method = scope["method"]
+        route = route_name(scope)
+        http_requests.inc((method, route, str(status_code)))
+        http_duration.observe((method, route), elapsed)
+        http_queries.observe((method, route), stats.queries)
+        http_db_duration.observe((method, route), stats.db_time)
+        threshold = settings.metrics_query_threshold
+        if threshold and stats.queries > threshold:
+            query_threshold_exceeded.inc((method, route))
+            logger.warning(
+                "%s %s issued %d SQL statements (threshold %d, %.1f ms in SQL); possible N+1",
+                method, route, stats.queries, threshold, stats.db_time * 1000
+            )
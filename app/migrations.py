@@ -0,0 +1,42 @@
+import os
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect, text
+from .database import engine
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Schema that Base.metadata.create_all produced before migrations existed
+BASELINE_REVISION = "0001"
+
+# Arbitrary key for pg_advisory_lock so concurrently starting workers migrate one at a time
+MIGRATION_LOCK_ID = 727_001
+
+def get_alembic_config() -> Config:
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(ROOT, "alembic"))
+    config.attributes["configure_logger"] = False
+    return config
+
+def run_migrations():
+    config = get_alembic_config()
+    with engine.connect() as connection:
+        is_postgres = connection.dialect.name == "postgresql"
+        if is_postgres:
+            connection.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+            connection.commit()
+        try:
+            config.attributes["connection"] = connection
+            inspector = inspect(connection)
+            needs_stamp = inspector.has_table("users") and not inspector.has_table("alembic_version")
+            # Inspection autobegins a transaction; Alembic must start its own, or
+            # autocommit_block() (CREATE INDEX CONCURRENTLY in 0003) refuses to run
+            connection.commit()
+            if needs_stamp:
+                command.stamp(config, BASELINE_REVISION)
+            command.upgrade(config, "head")
+            connection.commit()
+        finally:
+            if is_postgres:
+                connection.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+                connection.commit()
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Boolean, ForeignKey, Enum, Index, JSON, literal_column
+from sqlalchemy.dialects import postgresql  # registers the full-text search functions on func
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from .database import Base
 import enum
 
@@ -15,6 +16,15 @@ class OrderStatus(str, enum.Enum):
     CANCELED = "canceled"
     COMPLETED = "completed"
 
+def search_vector(name, description):
+    # Literal (not bound) arguments so queries match the GIN expression index exactly
+    return func.to_tsvector(
+        literal_column("'english'"),
+        func.coalesce(name, literal_column("''"))
+        + literal_column("' '")
+        + func.coalesce(description, literal_column("''"))
+    )
+
 class User(Base):
     __tablename__ = "users"
     
@@ -39,6 +49,16 @@ class Service(Base):
     category = Column(String, index=True)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        Index(
+            "ix_services_search_vector",
+            search_vector(name, description),
+            postgresql_using="gin"
+        ).ddl_if(dialect="postgresql"),
+    )
+
+OPEN_UNASSIGNED_ORDERS = "worker_id IS NULL AND status IN ('PENDING', 'PAID')"
 
 class Order(Base):
     __tablename__ = "orders"
@@ -56,3 +76,110 @@ class Order(Base):
     client = relationship("User", foreign_keys=[client_id], back_populates="orders")
     worker = relationship("User", foreign_keys=[worker_id], back_populates="worker_orders")
     service = relationship("Service")
+    
+    __table_args__ = (
+        Index("ix_orders_client_id_created_at", client_id, created_at),
+        Index("ix_orders_worker_id_created_at", worker_id, created_at),
+        Index("ix_orders_service_id", service_id),
+        Index("ix_orders_payment_intent_id", payment_intent_id, unique=True),
+        # Orders still waiting for a worker; enum columns store member names
+        Index(
+            "ix_orders_open_unassigned",
+            created_at,
+            id,
+            postgresql_where=text(OPEN_UNASSIGNED_ORDERS),
+            sqlite_where=text(OPEN_UNASSIGNED_ORDERS)
+        ),
+    )
+
+class PaymentEvent(Base):
+    # Provider webhook events, keyed by the provider's event id for deduplication
+    __tablename__ = "payment_events"
+    
+    id = Column(String, primary_key=True)
+    type = Column(String, nullable=False)
+    payment_intent_id = Column(String, nullable=True)
+    intent_status = Column(String, nullable=True)
+    received_at = Column(DateTime(timezone=True), server_default=func.now())
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+    
+    __table_args__ = (
+        Index(
+            "ix_payment_events_unprocessed",
+            received_at,
+            postgresql_where=text("processed_at IS NULL"),
+            sqlite_where=text("processed_at IS NULL")
+        ),
+    )
+
+class OrderEvent(Base):
+    # Transactional outbox: written in the same transaction as the order change
+    # it describes, delivered to WebSockets afterwards. The id is the sequence
+    # number clients resume from. user_id is NULL for role-wide broadcasts.
+    __tablename__ = "order_events"
+    
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
+    type = Column(String, nullable=False)
+    role = Column(String, nullable=False)
+    user_id = Column(Integer, nullable=True)
+    payload = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    dispatched_at = Column(DateTime(timezone=True), nullable=True)
+    
+    __table_args__ = (
+        Index("ix_order_events_user_id_id", user_id, id),
+        Index(
+            "ix_order_events_undispatched",
+            id,
+            postgresql_where=text("dispatched_at IS NULL"),
+            sqlite_where=text("dispatched_at IS NULL")
+        ),
+    )
+
+class IdempotencyKey(Base):
+    # Responses to POSTs sent with an Idempotency-Key header, replayed to retries
+    # from the same user until expires_at. status_code is NULL while the first
+    # request is still being handled.
+    __tablename__ = "idempotency_keys"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    key = Column(String, primary_key=True)
+    request_hash = Column(String, nullable=False)
+    status_code = Column(Integer, nullable=True)
+    response = Column(JSON, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    
+    __table_args__ = (
+        Index("ix_idempotency_keys_expires_at", expires_at),
+    )
+
+# Analytics rollups, maintained incrementally by app.analytics on every order
+# status transition. Rows for globally hot keys are spread over a few shards
+# so concurrent transactions do not queue on one row lock; readers SUM them.
+
+class DailyCategoryStats(Base):
+    __tablename__ = "daily_category_stats"
+    
+    day = Column(Date, primary_key=True)
+    category = Column(String, primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    orders_created = Column(Integer, nullable=False, default=0)
+    orders_paid = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+
+class OrderStatusCount(Base):
+    __tablename__ = "order_status_counts"
+    
+    status = Column(String, primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class WorkerCompletionStats(Base):
+    __tablename__ = "worker_completion_stats"
+    
+    worker_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    completed = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+    last_completed_at = Column(DateTime(timezone=True))
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Union
+from sqlalchemy import delete, event, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from . import models
+from .config import settings
+from .database import AsyncSessionLocal
+from .metrics import registry
+from .websocket_manager import manager
+
+logger = logging.getLogger(__name__)
+
+CLEANUP_INTERVAL = 300
+
+def add_order_event(
+    db: Union[Session, AsyncSession],
+    order_id: int,
+    type: str,
+    data: dict,
+    role: str,
+    user_id: Optional[int] = None
+):
+    # Staged on the caller's session so it commits or rolls back with the order change
+    db.add(models.OrderEvent(order_id=order_id, type=type, role=role, user_id=user_id, payload=data))
+    db.info["order_events"] = True
+
+class OutboxDispatcher:
+    # Drains order_events into the ConnectionManager in id order. Rows are only
+    # marked dispatched after publishing, so delivery is at-least-once and
+    # clients dedupe on seq. Commits that add events wake it up; the poll
+    # interval covers events committed by other processes. On PostgreSQL,
+    # SKIP LOCKED lets dispatchers in several workers share the table.
+    def __init__(self, batch_size: int, poll_interval: float, retention: int):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.dispatched = 0
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        self.loop = None
+
+    def wake(self):
+        # Sessions also commit from threadpool threads
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    async def _run(self):
+        last_cleanup = 0.0
+        while True:
+            self.wakeup.clear()
+            try:
+                while await self.drain() >= self.batch_size:
+                    pass
+                if self.retention and time.monotonic() - last_cleanup > CLEANUP_INTERVAL:
+                    await self.cleanup()
+                    last_cleanup = time.monotonic()
+            except Exception:
+                logger.exception("Order event dispatch failed")
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def drain(self) -> int:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(models.OrderEvent)
+                .where(models.OrderEvent.dispatched_at.is_(None))
+                .order_by(models.OrderEvent.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            events = result.scalars().all()
+            if not events:
+                return 0
+            for order_event in events:
+                await manager.publish(
+                    {"type": order_event.type, "data": order_event.payload, "seq": order_event.id},
+                    order_event.role,
+                    order_event.user_id
+                )
+            await db.execute(
+                update(models.OrderEvent)
+                .where(models.OrderEvent.id.in_([order_event.id for order_event in events]))
+                .values(dispatched_at=func.now())
+            )
+            await db.commit()
+        self.dispatched += len(events)
+        return len(events)
+
+    async def cleanup(self):
+        # Dispatched events are kept for the retention period so clients can resume
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.retention)
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                delete(models.OrderEvent).where(
+                    models.OrderEvent.dispatched_at.is_not(None),
+                    models.OrderEvent.created_at < cutoff
+                )
+            )
+            await db.commit()
+
+outbox_dispatcher = OutboxDispatcher(
+    batch_size=settings.outbox_batch_size,
+    poll_interval=settings.outbox_poll_interval,
+    retention=settings.outbox_retention
+)
+
+registry.gauge(
+    "outbox_dispatched_events_total",
+    "Order events published by this process's dispatcher",
+    [],
+    lambda: {(): outbox_dispatcher.dispatched},
+    type="counter"
+)
+
+@event.listens_for(Session, "after_commit")
+def _wake_dispatcher(session: Session):
+    if session.info.pop("order_events", False):
+        outbox_dispatcher.wake()
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_events(session: Session, previous_transaction):
+    session.info.pop("order_events", None)
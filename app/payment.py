@@ -1,72 +1,119 @@
-import stripe
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
-from .config import settings
+from sqlalchemy.ext.asyncio import AsyncSession
+from .crud import AsyncOrderCRUD
 from .models import Order, OrderStatus
+from .outbox import add_order_event
+from .payment_gateway import GatewayError, payment_gateway
 from .schemas import PaymentIntent
 
-stripe.api_key = settings.stripe_secret_key
-
 class PaymentService:
     @staticmethod
-    def create_payment_intent(order: Order, db: Session):
+    async def create_payment_intent(order: Order, db: AsyncSession, commit: bool = True):
+        await PaymentService._end_read(db)
         try:
-            intent = stripe.PaymentIntent.create(
+            intent = await payment_gateway.create_intent(
                 amount=int(order.total_amount * 100),
                 currency="usd",
-                metadata={"order_id": order.id}
+                metadata={"order_id": str(order.id)},
+                idempotency_key=f"order-{order.id}-create"
             )
-            
-            order.payment_intent_id = intent.id
-            db.commit()
-            
-            return {
-                "client_secret": intent.client_secret,
-                "payment_intent_id": intent.id
-            }
-        except Exception as e:
+        except GatewayError as e:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Payment creation failed: {str(e)}"
             )
-    
+
+        # Short write transaction of its own, or the caller's with commit=False
+        order.payment_intent_id = intent.id
+        PaymentService._add_status_event(db, order, "payment_created")
+        if commit:
+            await db.commit()
+        else:
+            await db.flush()
+
+        return {
+            "client_secret": intent.client_secret,
+            "payment_intent_id": intent.id
+        }
+
     @staticmethod
-    def confirm_payment(payment_intent_id: str, db: Session):
+    async def confirm_payment(order_id: int, payment_intent_id: str, db: AsyncSession):
+        order = await PaymentService._get_intent_order(db, order_id, payment_intent_id)
+
+        # Usually already settled by the webhook, so no provider round trip
+        if order.status == OrderStatus.PAID:
+            return {"status": "success", "message": "Payment confirmed"}
+
+        await PaymentService._end_read(db)
         try:
-            intent = stripe.PaymentIntent.retrieve(payment_intent_id)
-            
-            if intent.status == "succeeded":
-                order = db.query(Order).filter(Order.payment_intent_id == payment_intent_id).first()
-                if order:
-                    order.status = OrderStatus.PAID
-                    db.commit()
-                    return {"status": "success", "message": "Payment confirmed"}
-                else:
-                    raise HTTPException(status_code=404, detail="Order not found")
-            else:
-                raise HTTPException(status_code=400, detail="Payment not successful")
-                
-        except Exception as e:
+            intent = await payment_gateway.retrieve_intent(payment_intent_id)
+        except GatewayError as e:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Payment confirmation failed: {str(e)}"
             )
-    
+
+        if intent.status != "succeeded":
+            raise HTTPException(status_code=400, detail="Payment not successful")
+
+        # A webhook or a concurrent confirm may have settled it since the read above
+        if await AsyncOrderCRUD.transition_order(db, order.id, OrderStatus.PENDING, OrderStatus.PAID) is None:
+            await db.rollback()
+            await db.refresh(order)
+            if order.status != OrderStatus.PAID:
+                raise HTTPException(status_code=409, detail=f"Order is {order.status.value}, not pending")
+            return {"status": "success", "message": "Payment confirmed"}
+        PaymentService._add_status_event(db, order, "paid")
+        await db.commit()
+        return {"status": "success", "message": "Payment confirmed"}
+
     @staticmethod
-    def cancel_payment(payment_intent_id: str, db: Session):
+    async def cancel_payment(order_id: int, payment_intent_id: str, db: AsyncSession):
+        order = await PaymentService._get_intent_order(db, order_id, payment_intent_id)
+
+        if order.status == OrderStatus.CANCELED:
+            return {"status": "success", "message": "Payment canceled"}
+
+        if order.status != OrderStatus.PENDING:
+            raise HTTPException(status_code=409, detail=f"Order is {order.status.value}, not pending")
+
+        await PaymentService._end_read(db)
         try:
-            intent = stripe.PaymentIntent.cancel(payment_intent_id)
-            
-            order = db.query(Order).filter(Order.payment_intent_id == payment_intent_id).first()
-            if order:
-                order.status = OrderStatus.CANCELED
-                db.commit()
-                return {"status": "success", "message": "Payment canceled"}
-            else:
-                raise HTTPException(status_code=404, detail="Order not found")
-                
-        except Exception as e:
+            await payment_gateway.cancel_intent(payment_intent_id, idempotency_key=f"order-{order.id}-cancel")
+        except GatewayError as e:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Payment cancellation failed: {str(e)}"
             )
+
+        if await AsyncOrderCRUD.transition_order(db, order.id, OrderStatus.PENDING, OrderStatus.CANCELED) is None:
+            await db.rollback()
+            await db.refresh(order)
+            if order.status != OrderStatus.CANCELED:
+                raise HTTPException(status_code=409, detail=f"Order is {order.status.value}, not pending")
+            return {"status": "success", "message": "Payment canceled"}
+        PaymentService._add_status_event(db, order, "canceled")
+        await db.commit()
+        return {"status": "success", "message": "Payment canceled"}
+
+    @staticmethod
+    async def _get_intent_order(db: AsyncSession, order_id: int, payment_intent_id: str) -> Order:
+        # Callers check access to order_id, so the intent must belong to that order
+        order = await AsyncOrderCRUD.get_order_by_payment_intent(db, payment_intent_id)
+        if order is None or order.id != order_id:
+            raise HTTPException(status_code=404, detail="Payment intent not found for this order")
+        return order
+
+    @staticmethod
+    async def _end_read(db: AsyncSession):
+        # A provider call can take timeout x retries plus backoff. Ending the read
+        # transaction first returns the pooled connection for the duration, and
+        # expire_on_commit=False keeps the loaded order usable afterwards.
+        await db.commit()
+
+    @staticmethod
+    def _add_status_event(db: AsyncSession, order: Order, payment_status: str):
+        add_order_event(db, order.id, "payment_status", {
+            "id": order.id,
+            "status": payment_status
+        }, "clients", order.client_id)
@@ -0,0 +1,171 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+from .config import settings
+from .crud import AsyncOrderCRUD
+from .database import AsyncSessionLocal
+from .payment_gateway import payment_gateway
+
+logger = logging.getLogger(__name__)
+
+INTENT_ORDER_STATUS = {
+    "succeeded": models.OrderStatus.PAID,
+    "canceled": models.OrderStatus.CANCELED
+}
+
+# Intents are listed from this many seconds before the oldest pending order, for clock skew
+RECONCILE_SKEW = 3600
+
+class PaymentEventProcessor:
+    # Webhook events are stored by the receiver, deduplicated on the provider's
+    # event id, and applied here off the request path. Events that miss the
+    # in-memory queue (it was full, or the process died) are picked up from the
+    # table by the periodic sweep, which also reconciles pending orders in bulk.
+    def __init__(self, queue_size: int, batch_size: int):
+        self.batch_size = batch_size
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.worker_task: Optional[asyncio.Task] = None
+        self.reconcile_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self.worker_task = asyncio.create_task(self._worker())
+        if settings.payment_reconcile_interval > 0:
+            self.reconcile_task = asyncio.create_task(self._reconcile_loop())
+
+    async def stop(self):
+        for task in (self.worker_task, self.reconcile_task):
+            if task is not None:
+                task.cancel()
+        self.worker_task = self.reconcile_task = None
+
+    async def record(self, db: AsyncSession, event: dict) -> bool:
+        # Returns False for an event id that was already received. Events whose
+        # data is not shaped like a payment intent are stored and acknowledged but
+        # change nothing; a 4xx/5xx would only make the provider retry them forever.
+        data = event.get("data")
+        intent = data.get("object") if isinstance(data, dict) else None
+        is_intent = (
+            isinstance(intent, dict)
+            and intent.get("object") == "payment_intent"
+            and isinstance(intent.get("id"), str)
+            and isinstance(intent.get("status"), str)
+        )
+        db.add(models.PaymentEvent(
+            id=event["id"],
+            type=event["type"],
+            payment_intent_id=intent["id"] if is_intent else None,
+            intent_status=intent["status"] if is_intent else None
+        ))
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            return False
+        try:
+            self.queue.put_nowait(event["id"])
+        except asyncio.QueueFull:
+            logger.warning("Payment event queue full, leaving %s for the sweep", event["id"])
+        return True
+
+    async def _worker(self):
+        while True:
+            event_ids = [await self.queue.get()]
+            while len(event_ids) < self.batch_size and not self.queue.empty():
+                event_ids.append(self.queue.get_nowait())
+            try:
+                await self.process(event_ids)
+            except Exception:
+                logger.exception("Failed to process payment events")
+
+    async def process(self, event_ids: List[str]) -> int:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(models.PaymentEvent)
+                .where(models.PaymentEvent.id.in_(event_ids), models.PaymentEvent.processed_at.is_(None))
+                .order_by(models.PaymentEvent.received_at)
+            )
+            events = result.scalars().all()
+            if not events:
+                return 0
+            statuses: Dict[str, models.OrderStatus] = {}
+            for event in events:
+                status = INTENT_ORDER_STATUS.get(event.intent_status)
+                if event.payment_intent_id and status is not None:
+                    statuses[event.payment_intent_id] = status
+            await db.execute(
+                update(models.PaymentEvent)
+                .where(models.PaymentEvent.id.in_([event.id for event in events]))
+                .values(processed_at=func.now())
+            )
+            # Commits the processed marks together with the order updates and their events
+            await AsyncOrderCRUD.apply_payment_statuses(db, statuses)
+        return len(events)
+
+    async def sweep(self):
+        while True:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    select(models.PaymentEvent.id)
+                    .where(models.PaymentEvent.processed_at.is_(None))
+                    .order_by(models.PaymentEvent.received_at)
+                    .limit(self.batch_size)
+                )
+                event_ids = result.scalars().all()
+            if not event_ids or not await self.process(event_ids):
+                return
+
+    async def reconcile(self) -> int:
+        # Lists intents page by page instead of retrieving them one order at a time.
+        # Orders left pending longer than the lookback are not chased any more.
+        since = datetime.now(timezone.utc) - timedelta(seconds=settings.payment_reconcile_lookback)
+        async with AsyncSessionLocal() as db:
+            oldest = await db.scalar(
+                select(func.min(models.Order.created_at)).where(
+                    models.Order.status == models.OrderStatus.PENDING,
+                    models.Order.payment_intent_id.is_not(None),
+                    models.Order.created_at >= since
+                )
+            )
+        if oldest is None:
+            return 0
+        if oldest.tzinfo is None:
+            oldest = oldest.replace(tzinfo=timezone.utc)
+        created_gte = int(oldest.timestamp()) - RECONCILE_SKEW
+
+        updated = 0
+        starting_after = None
+        while True:
+            intents, has_more = await payment_gateway.list_intents(
+                created_gte, limit=settings.payment_reconcile_page_size, starting_after=starting_after
+            )
+            statuses = {
+                intent.id: INTENT_ORDER_STATUS[intent.status]
+                for intent in intents
+                if intent.status in INTENT_ORDER_STATUS
+            }
+            if statuses:
+                async with AsyncSessionLocal() as db:
+                    orders = await AsyncOrderCRUD.apply_payment_statuses(db, statuses)
+                updated += len(orders)
+            if not has_more or not intents:
+                return updated
+            starting_after = intents[-1].id
+
+    async def _reconcile_loop(self):
+        while True:
+            try:
+                await self.sweep()
+                await self.reconcile()
+            except Exception:
+                logger.exception("Payment reconciliation failed")
+            await asyncio.sleep(settings.payment_reconcile_interval)
+
+payment_processor = PaymentEventProcessor(
+    queue_size=settings.payment_event_queue_size,
+    batch_size=settings.payment_event_batch_size
+)
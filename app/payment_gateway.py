@@ -0,0 +1,224 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+import random
+import secrets
+import time
+from typing import Dict, List, Optional, Tuple
+import httpx
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {409, 429, 500, 502, 503, 504}
+
+class GatewayError(Exception):
+    pass
+
+class GatewayIntent:
+    def __init__(self, id: str, status: str, client_secret: Optional[str] = None, amount: int = 0, created: int = 0):
+        self.id = id
+        self.status = status
+        self.client_secret = client_secret
+        self.amount = amount
+        self.created = created
+
+class PaymentGateway:
+    # Async payment provider client. Keys passed as idempotency_key are stable
+    # per order, so a retried or repeated call never creates a second charge.
+    async def create_intent(self, amount: int, currency: str, metadata: Dict[str, str], idempotency_key: str) -> GatewayIntent:
+        raise NotImplementedError
+
+    async def retrieve_intent(self, intent_id: str) -> GatewayIntent:
+        raise NotImplementedError
+
+    async def cancel_intent(self, intent_id: str, idempotency_key: str) -> GatewayIntent:
+        raise NotImplementedError
+
+    async def list_intents(self, created_gte: int, limit: int = 100, starting_after: str = None) -> Tuple[List[GatewayIntent], bool]:
+        # One page of intents created at or after created_gte, newest first, and whether more follow
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+class StripeGateway(PaymentGateway):
+    # Talks to the Stripe REST API over one pooled HTTP/1.1 client. Transport
+    # errors, 409/429/5xx and Stripe-Should-Retry responses are retried with
+    # full-jitter exponential backoff, reusing the same idempotency key.
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = "https://api.stripe.com",
+        timeout: float = 10.0,
+        connect_timeout: float = 3.0,
+        max_retries: int = 2,
+        backoff: float = 0.5,
+        max_connections: int = 20
+    ):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            auth=(api_key, ""),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+
+    async def create_intent(self, amount: int, currency: str, metadata: Dict[str, str], idempotency_key: str) -> GatewayIntent:
+        data = {"amount": amount, "currency": currency}
+        for key, value in metadata.items():
+            data[f"metadata[{key}]"] = value
+        return self._intent(await self._request("POST", "/v1/payment_intents", data=data, idempotency_key=idempotency_key))
+
+    async def retrieve_intent(self, intent_id: str) -> GatewayIntent:
+        return self._intent(await self._request("GET", f"/v1/payment_intents/{intent_id}"))
+
+    async def cancel_intent(self, intent_id: str, idempotency_key: str) -> GatewayIntent:
+        return self._intent(await self._request("POST", f"/v1/payment_intents/{intent_id}/cancel", idempotency_key=idempotency_key))
+
+    async def list_intents(self, created_gte: int, limit: int = 100, starting_after: str = None) -> Tuple[List[GatewayIntent], bool]:
+        params = {"created[gte]": created_gte, "limit": limit}
+        if starting_after:
+            params["starting_after"] = starting_after
+        payload = await self._request("GET", "/v1/payment_intents", params=params)
+        return [self._intent(item) for item in payload["data"]], payload["has_more"]
+
+    async def _request(self, method: str, path: str, data: dict = None, params: dict = None, idempotency_key: str = None) -> dict:
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else {}
+        attempt = 0
+        while True:
+            try:
+                response = await self.client.request(method, path, data=data, params=params, headers=headers)
+            except httpx.TransportError as e:
+                if attempt >= self.max_retries:
+                    raise GatewayError(f"Payment provider unreachable: {e}") from e
+            else:
+                if response.status_code < 400:
+                    return response.json()
+                if attempt >= self.max_retries or not self._should_retry(response):
+                    raise GatewayError(self._error_message(response))
+            await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+            attempt += 1
+            logger.info("Retrying %s %s (attempt %d)", method, path, attempt)
+
+    @staticmethod
+    def _should_retry(response: httpx.Response) -> bool:
+        should_retry = response.headers.get("stripe-should-retry")
+        if should_retry is not None:
+            return should_retry == "true"
+        return response.status_code in RETRYABLE_STATUS
+
+    @staticmethod
+    def _error_message(response: httpx.Response) -> str:
+        try:
+            return response.json()["error"]["message"]
+        except (ValueError, KeyError, TypeError):
+            return f"Payment provider returned {response.status_code}"
+
+    @staticmethod
+    def _intent(payload: dict) -> GatewayIntent:
+        return GatewayIntent(
+            id=payload["id"],
+            status=payload["status"],
+            client_secret=payload.get("client_secret"),
+            amount=payload.get("amount", 0),
+            created=payload.get("created", 0)
+        )
+
+    async def close(self):
+        await self.client.aclose()
+
+class FakeGateway(PaymentGateway):
+    # Offline gateway for development, tests and benchmarks. Intents succeed on
+    # their first retrieval unless canceled, as if the card had been charged.
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.intents: Dict[str, GatewayIntent] = {}
+        self.idempotency: Dict[str, str] = {}
+
+    async def _delay(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def create_intent(self, amount: int, currency: str, metadata: Dict[str, str], idempotency_key: str) -> GatewayIntent:
+        await self._delay()
+        intent_id = self.idempotency.get(idempotency_key)
+        if intent_id is None:
+            intent_id = "pi_fake_" + secrets.token_hex(12)
+            self.intents[intent_id] = GatewayIntent(
+                id=intent_id,
+                status="requires_payment_method",
+                client_secret=f"{intent_id}_secret_{secrets.token_hex(12)}",
+                amount=amount,
+                created=int(time.time())
+            )
+            self.idempotency[idempotency_key] = intent_id
+        return self.intents[intent_id]
+
+    async def retrieve_intent(self, intent_id: str) -> GatewayIntent:
+        await self._delay()
+        intent = self._get(intent_id)
+        if intent.status != "canceled":
+            intent.status = "succeeded"
+        return intent
+
+    async def cancel_intent(self, intent_id: str, idempotency_key: str) -> GatewayIntent:
+        await self._delay()
+        intent = self._get(intent_id)
+        if intent.status == "succeeded":
+            raise GatewayError("You cannot cancel this PaymentIntent because it has a status of succeeded.")
+        intent.status = "canceled"
+        return intent
+
+    async def list_intents(self, created_gte: int, limit: int = 100, starting_after: str = None) -> Tuple[List[GatewayIntent], bool]:
+        await self._delay()
+        # dicts keep insertion order, so reversed() is newest first
+        intents = [intent for intent in reversed(self.intents.values()) if intent.created >= created_gte]
+        if starting_after is not None:
+            ids = [intent.id for intent in intents]
+            intents = intents[ids.index(starting_after) + 1:] if starting_after in ids else []
+        return intents[:limit], len(intents) > limit
+
+    def _get(self, intent_id: str) -> GatewayIntent:
+        intent = self.intents.get(intent_id)
+        if intent is None:
+            raise GatewayError(f"No such payment_intent: '{intent_id}'")
+        return intent
+
+def verify_webhook_signature(payload: bytes, header: Optional[str], secret: str, tolerance: int = 300):
+    # Stripe-Signature: t=<unix time>,v1=<hex HMAC-SHA256 of "t.payload">[,v1=...]
+    if not header:
+        raise GatewayError("Missing signature header")
+    timestamp = None
+    signatures = []
+    for item in header.split(","):
+        key, _, value = item.strip().partition("=")
+        if key == "t":
+            timestamp = value
+        elif key == "v1":
+            signatures.append(value)
+    if timestamp is None or not timestamp.isdigit() or not signatures:
+        raise GatewayError("Malformed signature header")
+    if tolerance and abs(time.time() - int(timestamp)) > tolerance:
+        raise GatewayError("Signature timestamp outside the tolerance zone")
+    expected = hmac.new(secret.encode(), timestamp.encode() + b"." + payload, hashlib.sha256).hexdigest()
+    if not any(hmac.compare_digest(expected, signature) for signature in signatures):
+        raise GatewayError("No matching signature")
+
+def create_gateway() -> PaymentGateway:
+    if settings.payment_gateway == "stripe":
+        return StripeGateway(
+            settings.stripe_secret_key,
+            timeout=settings.payment_timeout,
+            connect_timeout=settings.payment_connect_timeout,
+            max_retries=settings.payment_max_retries,
+            backoff=settings.payment_retry_backoff,
+            max_connections=settings.payment_max_connections
+        )
+    if settings.payment_gateway == "fake":
+        return FakeGateway(latency=settings.payment_fake_latency)
+    raise ValueError(f"Unknown PAYMENT_GATEWAY: {settings.payment_gateway}")
+
+payment_gateway = create_gateway()
@@ -0,0 +1,231 @@
+import os
+import random
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.routing import Route
+from .config import settings
+from .metrics import route_name
+
+MAX_STACK_DEPTH = 128
+MAX_STATEMENTS_PER_ROUTE = 200
+
+# Route.handle is on the event loop thread's stack while a request is routed there;
+# its frame's locals carry the request scope and the matched route
+ROUTE_HANDLE_CODE = Route.handle.__code__
+
+_PATH_PREFIXES = sorted(
+    {
+        path + os.sep
+        for path in (sysconfig.get_paths()["purelib"], sysconfig.get_paths()["stdlib"], os.getcwd())
+        if path
+    },
+    key=len,
+    reverse=True
+)
+
+def _short_path(filename: str) -> str:
+    for prefix in _PATH_PREFIXES:
+        if filename.startswith(prefix):
+            return filename[len(prefix):]
+    return filename
+
+class SampledRequest:
+    __slots__ = ("scope", "statements")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.statements: List[tuple] = []
+
+# The sampled request being served in this context, for SQL capture
+profiled_request: ContextVar[Optional[SampledRequest]] = ContextVar("profiled_request", default=None)
+
+class SamplingProfiler:
+    # Statistical profiler for a fraction of requests. While any sampled request is
+    # in flight a background thread snapshots every thread's stack each interval and
+    # attributes it to a route: on the event loop through the Route.handle frame of
+    # a sampled request, in threadpool threads through the sync endpoint's frame
+    # (so those samples can include concurrent unsampled requests to the same
+    # route). Idle when nothing is sampled, so the cost is the sampled fraction.
+    def __init__(self, sample_rate: float, interval: float):
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.active = False
+        self.started_at: Optional[float] = None
+        self.lock = threading.Lock()
+        self.in_flight: Dict[int, SampledRequest] = {}
+        self.endpoints: Dict[object, str] = {}
+        self.stacks: Dict[str, Counter] = {}
+        self.statements: Dict[str, Dict[str, List[float]]] = {}
+        self.requests: Counter = Counter()
+        self.samples = 0
+        self.wakeup = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def install(self, app):
+        # Sync endpoints run in threadpool threads, away from Route.handle
+        for route in app.routes:
+            endpoint = getattr(route, "endpoint", None)
+            if isinstance(route, Route) and hasattr(endpoint, "__code__"):
+                self.endpoints[endpoint.__code__] = route.path
+
+    def start(self, sample_rate: Optional[float] = None):
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        self.active = True
+        self.started_at = time.time()
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.active = False
+
+    def reset(self):
+        with self.lock:
+            self.stacks = {}
+            self.statements = {}
+            self.requests = Counter()
+            self.samples = 0
+            self.started_at = time.time() if self.active else None
+
+    def begin(self, scope: dict) -> Optional[SampledRequest]:
+        if not self.active or random.random() >= self.sample_rate:
+            return None
+        request = SampledRequest(scope)
+        with self.lock:
+            self.in_flight[id(scope)] = request
+        self.wakeup.set()
+        return request
+
+    def end(self, request: SampledRequest):
+        route = route_name(request.scope)
+        with self.lock:
+            self.in_flight.pop(id(request.scope), None)
+            self.requests[route] += 1
+            statements = self.statements.setdefault(route, {})
+            for statement, elapsed in request.statements:
+                entry = statements.get(statement)
+                if entry is None:
+                    if len(statements) >= MAX_STATEMENTS_PER_ROUTE:
+                        continue
+                    entry = statements[statement] = [0, 0.0]
+                entry[0] += 1
+                entry[1] += elapsed
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            if not self.in_flight:
+                self.wakeup.clear()
+                self.wakeup.wait()
+                continue
+            self.sample(own)
+            time.sleep(self.interval)
+
+    def sample(self, own: int):
+        with self.lock:
+            in_flight = dict(self.in_flight)
+        sampled_routes = {route_name(request.scope) for request in in_flight.values()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            stack = []
+            endpoint_route = None
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})")
+                if code is ROUTE_HANDLE_CODE:
+                    # On the event loop the request itself decides, whatever the endpoint
+                    scope = frame.f_locals.get("scope")
+                    endpoint_route = route_name(scope) if scope is not None and id(scope) in in_flight else None
+                    break
+                if endpoint_route is None and self.endpoints.get(code) in sampled_routes:
+                    endpoint_route = self.endpoints[code]
+                frame = frame.f_back
+            route = endpoint_route
+            if route is None:
+                continue
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            collapsed = ";".join([route] + stack[::-1])
+            with self.lock:
+                self.stacks.setdefault(route, Counter())[collapsed] += 1
+                self.samples += 1
+
+    def collapsed(self, route: Optional[str] = None) -> str:
+        # Brendan Gregg's collapsed format: flamegraph.pl, speedscope, inferno
+        with self.lock:
+            stacks = [(stack, count) for name, counter in self.stacks.items() if route in (None, name) for stack, count in counter.items()]
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks))
+
+    def sql(self, route: Optional[str] = None) -> Dict[str, List[dict]]:
+        with self.lock:
+            return {
+                name: sorted(
+                    (
+                        {"statement": statement, "count": count, "total_ms": round(total * 1000, 3)}
+                        for statement, (count, total) in statements.items()
+                    ),
+                    key=lambda item: item["total_ms"],
+                    reverse=True
+                )
+                for name, statements in self.statements.items()
+                if route in (None, name)
+            }
+
+    def status(self) -> dict:
+        with self.lock:
+            return {
+                "enabled": settings.profiling_enabled,
+                "active": self.active,
+                "sample_rate": self.sample_rate,
+                "interval": self.interval,
+                "started_at": self.started_at,
+                "samples": self.samples,
+                "in_flight": len(self.in_flight),
+                "requests": dict(self.requests)
+            }
+
+profiler = SamplingProfiler(sample_rate=settings.profiling_sample_rate, interval=settings.profiling_interval)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if profiled_request.get() is not None:
+        conn.info["profile_started"] = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    request = profiled_request.get()
+    started = conn.info.pop("profile_started", None)
+    if request is not None and started is not None:
+        request.statements.append((statement, time.perf_counter() - started))
+
+def capture_statements(engine: Engine):
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request = profiler.begin(scope)
+        if request is None:
+            await self.app(scope, receive, send)
+            return
+        token = profiled_request.set(request)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiled_request.reset(token)
+            profiler.end(request)
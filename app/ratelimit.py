@@ -0,0 +1,199 @@
+import asyncio
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Tuple
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordRequestForm
+from .auth import get_current_active_user
+from .config import settings
+from .metrics import registry
+from .models import User
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+rate_limited = registry.counter("rate_limited_requests_total", "Requests rejected by a rate limit", ["limit"])
+shed_requests = registry.counter("admission_shed_requests_total", "Requests shed by admission control", ["reason"])
+
+@lru_cache(maxsize=None)
+def parse_rate(value: str) -> Optional[Tuple[float, float]]:
+    # "10/minute" -> (capacity 10, refill 10/60 tokens per second); "" or "0" disables
+    if not value or value.strip() == "0":
+        return None
+    count, _, period = value.partition("/")
+    seconds = PERIODS.get(period.strip().rstrip("s") or "second")
+    if seconds is None:
+        raise ValueError(f"Unknown rate period in {value!r}")
+    capacity = float(count)
+    return capacity, capacity / seconds
+
+class RateLimitStore:
+    # Token buckets keyed by string. A shared implementation (Redis, a database)
+    # makes the limits hold across processes; take() must be atomic per key.
+    async def take(self, key: str, capacity: float, rate: float, cost: float = 1.0) -> Tuple[bool, float]:
+        # Returns (allowed, seconds until cost tokens are available)
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+class _Shard:
+    __slots__ = ("lock", "buckets")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets: OrderedDict = OrderedDict()
+
+class MemoryRateLimitStore(RateLimitStore):
+    # Per-process buckets, striped over shards so concurrent threads rarely share
+    # a lock. Each shard evicts its least recently used keys beyond its share of
+    # max_keys; an evicted bucket would have refilled to full anyway unless it was
+    # hit recently, and recently hit keys are the last to go.
+    def __init__(self, shards: int, max_keys: int):
+        self.shards = [_Shard() for _ in range(shards)]
+        self.max_keys_per_shard = max(1, max_keys // shards)
+
+    def take_now(self, key: str, capacity: float, rate: float, cost: float = 1.0) -> Tuple[bool, float]:
+        shard = self.shards[hash(key) % len(self.shards)]
+        now = time.monotonic()
+        with shard.lock:
+            bucket = shard.buckets.get(key)
+            if bucket is None:
+                tokens = capacity
+                if len(shard.buckets) >= self.max_keys_per_shard:
+                    shard.buckets.popitem(last=False)
+            else:
+                tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                shard.buckets.move_to_end(key)
+            if tokens >= cost:
+                shard.buckets[key] = (tokens - cost, now)
+                return True, 0.0
+            shard.buckets[key] = (tokens, now)
+            return False, (cost - tokens) / rate
+
+    async def take(self, key: str, capacity: float, rate: float, cost: float = 1.0) -> Tuple[bool, float]:
+        return self.take_now(key, capacity, rate, cost)
+
+    def size(self) -> int:
+        return sum(len(shard.buckets) for shard in self.shards)
+
+def create_rate_limit_store() -> RateLimitStore:
+    if settings.rate_limit_store == "memory":
+        return MemoryRateLimitStore(shards=settings.rate_limit_shards, max_keys=settings.rate_limit_max_keys)
+    raise ValueError(f"Unknown rate limit store: {settings.rate_limit_store}")
+
+class RateLimiter:
+    def __init__(self, store: RateLimitStore):
+        self.store = store
+
+    async def hit(self, name: str, identity: str, limit: str):
+        rate = parse_rate(limit)
+        if not settings.rate_limit_enabled or rate is None:
+            return
+        capacity, refill = rate
+        allowed, retry_after = await self.store.take(f"{name}:{identity}", capacity, refill)
+        if not allowed:
+            rate_limited.inc((name,))
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, please retry later",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+            )
+
+rate_limiter = RateLimiter(create_rate_limit_store())
+
+def client_ip(request: Request) -> str:
+    if settings.rate_limit_trust_forwarded:
+        # The last hop is the one our own proxy appended; earlier ones are client-supplied
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[-1].strip()
+    return request.client.host if request.client else "unknown"
+
+def limit_by_ip(name: str, limit: str):
+    async def dependency(request: Request):
+        await rate_limiter.hit(name, client_ip(request), limit)
+    return dependency
+
+def limit_by_user(name: str, limit: str):
+    async def dependency(current_user: User = Depends(get_current_active_user)):
+        await rate_limiter.hit(name, str(current_user.id), limit)
+    return dependency
+
+async def limit_login_username(form_data: OAuth2PasswordRequestForm = Depends()):
+    # Caps guesses against one account however many addresses they come from
+    await rate_limiter.hit("login_username", form_data.username.lower(), settings.rate_limit_login_username)
+
+class AdmissionMiddleware:
+    # Global concurrency limit. Requests beyond max_concurrency wait in a bounded
+    # queue for up to queue_timeout; when the queue is full or the wait runs out
+    # they get 503 with Retry-After straight away, so overload turns into fast
+    # rejections instead of every request slowing down.
+    def __init__(
+        self,
+        app,
+        max_concurrency: int,
+        queue_size: int,
+        queue_timeout: float,
+        retry_after: int,
+        exempt_paths: Tuple[str, ...] = ("/metrics",)
+    ):
+        self.app = app
+        self.max_concurrency = max_concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.exempt_paths = exempt_paths
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        registry.gauge(
+            "admission_requests",
+            "Requests admitted and waiting for admission",
+            ["state"],
+            lambda: {("in_flight",): self.in_flight, ("waiting",): self.waiting}
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exempt_paths):
+            await self.app(scope, receive, send)
+            return
+
+        if self.semaphore.locked():
+            if self.waiting >= self.queue_size:
+                await self.reject(send, "queue_full")
+                return
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self.semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                await self.reject(send, "queue_timeout")
+                return
+            finally:
+                self.waiting -= 1
+        else:
+            await self.semaphore.acquire()
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+            self.semaphore.release()
+
+    async def reject(self, send, reason: str):
+        shed_requests.inc((reason,))
+        body = json.dumps({"detail": "Server is busy, please retry later"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status.HTTP_503_SERVICE_UNAVAILABLE,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(self.retry_after).encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
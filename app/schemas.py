@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
-from datetime import datetime
+from typing import Any, Dict, Optional, List
+from datetime import date, datetime
 from .models import UserRole, OrderStatus
 
 class UserBase(BaseModel):
@@ -31,6 +31,9 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     username: Optional[str] = None
+    user_id: Optional[int] = None
+    role: Optional[UserRole] = None
+    is_active: Optional[bool] = None
 
 class ServiceBase(BaseModel):
     name: str
@@ -49,6 +52,11 @@ class Service(ServiceBase):
     class Config:
         from_attributes = True
 
+class ServiceSearchResult(BaseModel):
+    total: int
+    items: List[Service]
+    facets: Dict[str, int]
+
 class OrderBase(BaseModel):
     service_id: int
 
@@ -78,7 +86,36 @@ class OrderWithDetails(Order):
     worker: Optional[User]
     service: Service
 
+class OrderEvent(BaseModel):
+    seq: int
+    type: str
+    data: Dict[str, Any]
+    created_at: datetime
+
 class PaymentIntent(BaseModel):
     amount: int
     currency: str = "usd"
     payment_method_types: List[str] = ["card"]
+
+class DailyCategoryStats(BaseModel):
+    day: date
+    category: str
+    orders_created: int
+    orders_paid: int
+    revenue: float
+
+class WorkerStats(BaseModel):
+    worker_id: int
+    username: str
+    completed: int
+    revenue: float
+    last_completed_at: Optional[datetime]
+
+class MarketplaceStats(BaseModel):
+    start: date
+    end: date
+    status_counts: Dict[str, int]
+    orders_created: int
+    orders_paid: int
+    revenue: float
+    revenue_by_category: Dict[str, float]
@@ -0,0 +1,255 @@
+import asyncio
+import bisect
+import heapq
+import re
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, func, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+from .catalog_cache import catalog_cache
+from .config import settings
+from .database import AsyncSessionLocal
+from .schemas import Service
+
+SORT_OPTIONS = ("relevance", "price_asc", "price_desc", "newest")
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+NAME_WEIGHT = 3
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+class ServiceSearchIndex:
+    # In-memory inverted index over active services, used where PostgreSQL
+    # full-text search is unavailable. It is rebuilt whenever the catalog
+    # version moves (admin mutations) or the catalog cache TTL has passed;
+    # after the first build, searches keep using the previous index meanwhile.
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.version = None
+        self.built_at = 0.0
+        self.docs: Dict[int, Service] = {}
+        self.postings: Dict[str, Dict[int, int]] = {}
+        # Parallel arrays sorted by (price, id), overall and per category
+        self.price_index = PriceIndex([])
+        self.category_price_index: Dict[str, PriceIndex] = {}
+        self.newest_rank: Dict[int, int] = {}
+        self.newest_ids: List[int] = []
+        self.category_newest_ids: Dict[str, List[int]] = {}
+        self.category_counts: Counter = Counter()
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def is_stale(self) -> bool:
+        return self.version != catalog_cache.version or time.monotonic() - self.built_at > self.ttl
+
+    async def ensure_fresh(self, db: AsyncSession):
+        if not self.is_stale():
+            return
+        if self.version is None:
+            await self.refresh(db)
+        elif self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_in_background())
+
+    async def _refresh_in_background(self):
+        async with AsyncSessionLocal() as db:
+            await self.refresh(db)
+
+    async def refresh(self, db: AsyncSession):
+        async with self._lock:
+            if not self.is_stale():
+                return
+            version = catalog_cache.version
+            result = await db.execute(select(models.Service).where(models.Service.is_active == True))
+            services = [Service.model_validate(service) for service in result.scalars()]
+            await run_in_threadpool(self.build, services)
+            self.version = version
+
+    def build(self, services: List[Service]):
+        docs: Dict[int, Service] = {}
+        postings: Dict[str, Dict[int, int]] = {}
+        for service in services:
+            docs[service.id] = service
+            weights = dict.fromkeys(tokenize(service.name), NAME_WEIGHT)
+            for token in tokenize(service.description):
+                weights[token] = weights.get(token, 0) + 1
+            for token, weight in weights.items():
+                postings.setdefault(token, {})[service.id] = weight
+
+        by_price = sorted(services, key=lambda s: (s.price, s.id))
+        by_category: Dict[str, List[Service]] = {}
+        for service in by_price:
+            by_category.setdefault(service.category, []).append(service)
+        newest = sorted(services, key=lambda s: (s.created_at, s.id), reverse=True)
+        category_newest_ids: Dict[str, List[int]] = {}
+        for service in newest:
+            category_newest_ids.setdefault(service.category, []).append(service.id)
+
+        self.docs = docs
+        self.postings = postings
+        self.price_index = PriceIndex(by_price)
+        self.category_price_index = {category: PriceIndex(items) for category, items in by_category.items()}
+        self.newest_rank = {service.id: rank for rank, service in enumerate(newest)}
+        self.newest_ids = [service.id for service in newest]
+        self.category_newest_ids = category_newest_ids
+        self.category_counts = Counter({category: len(items) for category, items in by_category.items()})
+        self.built_at = time.monotonic()
+
+    def _match(self, tokens: List[str]) -> Dict[int, int]:
+        lists = [self.postings.get(token) for token in tokens]
+        if not all(lists):
+            return {}
+        lists.sort(key=len)
+        scores = dict(lists[0])
+        for postings in lists[1:]:
+            scores = {doc_id: score + postings[doc_id] for doc_id, score in scores.items() if doc_id in postings}
+        return scores
+
+    def search(
+        self,
+        q: Optional[str] = None,
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        sort: str = "relevance",
+        skip: int = 0,
+        limit: int = 20
+    ) -> dict:
+        tokens = tokenize(q)
+        if tokens:
+            return self._search_text(tokens, category, min_price, max_price, sort, skip, limit)
+        return self._browse(category, min_price, max_price, sort, skip, limit)
+
+    def _browse(self, category, min_price, max_price, sort, skip, limit) -> dict:
+        # No text query: price ranges are bisected out of presorted arrays
+        unbounded = min_price is None and max_price is None
+        if unbounded:
+            facets = self.category_counts
+        else:
+            facets = {}
+            for facet, facet_index in self.category_price_index.items():
+                facet_lo, facet_hi = facet_index.range(min_price, max_price)
+                if facet_hi > facet_lo:
+                    facets[facet] = facet_hi - facet_lo
+
+        index = self.price_index
+        if category is not None:
+            index = self.category_price_index.get(category, PriceIndex([]))
+        lo, hi = index.range(min_price, max_price)
+        total = hi - lo
+
+        if sort == "price_asc":
+            page = index.ids[lo + skip:min(lo + skip + limit, hi)]
+        elif sort == "price_desc":
+            end = max(hi - skip, lo)
+            page = index.ids[max(end - limit, lo):end][::-1]
+        elif unbounded:
+            newest_ids = self.newest_ids if category is None else self.category_newest_ids.get(category, [])
+            page = newest_ids[skip:skip + limit]
+        else:
+            page = heapq.nsmallest(skip + limit, index.ids[lo:hi], key=self.newest_rank.__getitem__)[skip:]
+
+        return {
+            "total": total,
+            "items": [self.docs[doc_id] for doc_id in page],
+            "facets": dict(facets)
+        }
+
+    def _search_text(self, tokens, category, min_price, max_price, sort, skip, limit) -> dict:
+        scores = self._match(tokens)
+        facets = Counter()
+        matched = []
+        for doc_id in scores:
+            doc = self.docs[doc_id]
+            if min_price is not None and doc.price < min_price:
+                continue
+            if max_price is not None and doc.price > max_price:
+                continue
+            facets[doc.category] += 1
+            if category is not None and doc.category != category:
+                continue
+            matched.append(doc_id)
+
+        if sort == "price_asc":
+            key = lambda doc_id: (self.docs[doc_id].price, doc_id)
+        elif sort == "price_desc":
+            key = lambda doc_id: (-self.docs[doc_id].price, -doc_id)
+        elif sort == "newest":
+            key = self.newest_rank.__getitem__
+        else:
+            key = lambda doc_id: (-scores[doc_id], doc_id)
+
+        return {
+            "total": len(matched),
+            "items": [self.docs[doc_id] for doc_id in heapq.nsmallest(skip + limit, matched, key=key)[skip:]],
+            "facets": dict(facets)
+        }
+
+class PriceIndex:
+    def __init__(self, services: List[Service]):
+        self.ids = [service.id for service in services]
+        self.prices = [service.price for service in services]
+        self.categories = [service.category for service in services]
+
+    def range(self, min_price: Optional[float], max_price: Optional[float]) -> Tuple[int, int]:
+        lo = 0 if min_price is None else bisect.bisect_left(self.prices, min_price)
+        hi = len(self.prices) if max_price is None else bisect.bisect_right(self.prices, max_price)
+        return lo, max(lo, hi)
+
+search_index = ServiceSearchIndex(ttl=settings.search_index_ttl)
+
+async def search_services_postgres(
+    db: AsyncSession,
+    q: Optional[str] = None,
+    category: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    sort: str = "relevance",
+    skip: int = 0,
+    limit: int = 20
+) -> dict:
+    conditions = [models.Service.is_active == True]
+    rank = None
+    if q and q.strip():
+        vector = models.search_vector(models.Service.name, models.Service.description)
+        query = func.websearch_to_tsquery(literal_column("'english'"), q)
+        conditions.append(vector.bool_op("@@")(query))
+        rank = func.ts_rank(vector, query)
+    if min_price is not None:
+        conditions.append(models.Service.price >= min_price)
+    if max_price is not None:
+        conditions.append(models.Service.price <= max_price)
+
+    facet_rows = await db.execute(
+        select(models.Service.category, func.count()).where(and_(*conditions)).group_by(models.Service.category)
+    )
+    facets = {row_category: count for row_category, count in facet_rows}
+
+    if category is not None:
+        conditions.append(models.Service.category == category)
+        total = facets.get(category, 0)
+    else:
+        total = sum(facets.values())
+
+    if sort == "price_asc":
+        order_by = [models.Service.price.asc(), models.Service.id.asc()]
+    elif sort == "price_desc":
+        order_by = [models.Service.price.desc(), models.Service.id.desc()]
+    elif sort == "newest" or rank is None:
+        order_by = [models.Service.created_at.desc(), models.Service.id.desc()]
+    else:
+        order_by = [rank.desc(), models.Service.id.asc()]
+
+    result = await db.execute(
+        select(models.Service).where(and_(*conditions)).order_by(*order_by).offset(skip).limit(limit)
+    )
+    return {"total": total, "items": result.scalars().all(), "facets": facets}
+
+async def search_services(db: AsyncSession, **params) -> dict:
+    if db.bind.dialect.name == "postgresql":
+        return await search_services_postgres(db, **params)
+    await search_index.ensure_fresh(db)
+    return search_index.search(**params)
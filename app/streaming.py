@@ -0,0 +1,223 @@
+import codecs
+import csv
+import enum
+import io
+import json
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Type
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import Select
+from .database import AsyncSessionLocal
+
+FORMAT_NDJSON = "ndjson"
+FORMAT_CSV = "csv"
+FORMATS = (FORMAT_NDJSON, FORMAT_CSV)
+
+# Longest line or CSV record accepted, so neither a missing newline nor an
+# unbalanced quote can make the reader buffer the whole upload
+MAX_RECORD_SIZE = 1 << 20
+
+MEDIA_TYPES = {
+    FORMAT_NDJSON: "application/x-ndjson",
+    FORMAT_CSV: "text/csv"
+}
+
+def request_format(request: Request) -> str:
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in ("text/csv", "application/csv"):
+        return FORMAT_CSV
+    if content_type in ("application/x-ndjson", "application/jsonl", "application/json", ""):
+        return FORMAT_NDJSON
+    raise HTTPException(status_code=415, detail=f"Unsupported content type: {content_type}")
+
+async def read_lines(request: Request) -> AsyncIterator[Optional[str]]:
+    # Yields None in place of a line longer than MAX_RECORD_SIZE; the rest of it
+    # is discarded as it arrives instead of being buffered
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    skipping = False
+    async for chunk in request.stream():
+        buffer += decoder.decode(chunk)
+        lines = buffer.split("\n")
+        buffer = lines.pop()
+        for line in lines:
+            if skipping:
+                skipping = False
+                continue
+            yield line if len(line) <= MAX_RECORD_SIZE else None
+        if len(buffer) > MAX_RECORD_SIZE:
+            if not skipping:
+                yield None
+                skipping = True
+            buffer = ""
+    buffer += decoder.decode(b"", final=True)
+    if buffer and not skipping:
+        yield buffer if len(buffer) <= MAX_RECORD_SIZE else None
+
+async def read_records(request: Request, fmt: str) -> AsyncIterator[Tuple[int, Any]]:
+    # Yields (line number, dict) per record, or (line number, error message)
+    # for lines that cannot be parsed. Blank lines are skipped.
+    line_number = 0
+    if fmt == FORMAT_NDJSON:
+        async for line in read_lines(request):
+            line_number += 1
+            if line is None:
+                yield line_number, f"Line longer than {MAX_RECORD_SIZE} characters"
+                continue
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, f"Invalid JSON: {e}"
+                continue
+            if isinstance(record, dict):
+                yield line_number, record
+            else:
+                yield line_number, "Expected a JSON object"
+        return
+
+    header = None
+    pending = ""
+    start = 0
+    async for line in read_lines(request):
+        line_number += 1
+        if line is None:
+            yield start if pending else line_number, "Record too large or unterminated quoted field"
+            pending = ""
+            continue
+        if not pending:
+            start = line_number
+        pending += line if not pending else "\n" + line
+        # An odd number of quotes means a quoted field continues on the next line
+        if pending.count('"') % 2:
+            if len(pending) > MAX_RECORD_SIZE:
+                yield start, "Record too large or unterminated quoted field"
+                pending = ""
+            continue
+        record, pending = pending.rstrip("\r"), ""
+        if not record.strip():
+            continue
+        values = next(csv.reader([record]))
+        if header is None:
+            header = [name.strip() for name in values]
+        elif len(values) != len(header):
+            yield start, f"Expected {len(header)} columns, got {len(values)}"
+        else:
+            yield start, dict(zip(header, values))
+    if pending:
+        yield start, "Unterminated quoted field"
+
+def validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc']) or 'row'}: {item['msg']}"
+        for item in error.errors()
+    )
+
+def insert_error_message(error: Exception) -> str:
+    # The driver's message, without the SQL and parameters SQLAlchemy appends
+    message = str(getattr(error, "orig", None) or error).strip().split("\n")[0]
+    return f"{error.__class__.__name__}: {message}" if message else error.__class__.__name__
+
+async def bulk_import(
+    records: AsyncIterator[Tuple[int, Any]],
+    schema: Type[BaseModel],
+    insert: Callable[[List[dict]], Awaitable[None]],
+    chunk_size: int,
+    max_errors: int
+) -> dict:
+    # Validates records against schema and hands valid rows to insert one chunk
+    # (one transaction) at a time. Only the first max_errors errors are reported.
+    inserted = failed = 0
+    errors: List[Dict[str, Any]] = []
+
+    def add_error(line_number: int, message: str):
+        nonlocal failed
+        failed += 1
+        if len(errors) < max_errors:
+            errors.append({"line": line_number, "error": message})
+
+    async def flush(chunk: List[Tuple[int, dict]]):
+        nonlocal inserted
+        try:
+            await insert([row for _, row in chunk])
+        except Exception as e:
+            if len(chunk) > 1:
+                # Retry row by row so only the rows that fail are reported, each with its own error
+                for item in chunk:
+                    await flush([item])
+            else:
+                add_error(chunk[0][0], f"Insert failed: {insert_error_message(e)}")
+        else:
+            inserted += len(chunk)
+
+    chunk: List[Tuple[int, dict]] = []
+    async for line_number, record in records:
+        if isinstance(record, str):
+            add_error(line_number, record)
+            continue
+        try:
+            row = schema.model_validate(record).model_dump()
+        except ValidationError as e:
+            add_error(line_number, validation_message(e))
+            continue
+        chunk.append((line_number, row))
+        if len(chunk) >= chunk_size:
+            await flush(chunk)
+            chunk = []
+    if chunk:
+        await flush(chunk)
+
+    return {
+        "inserted": inserted,
+        "failed": failed,
+        "errors": errors,
+        "errors_truncated": failed > len(errors)
+    }
+
+def _json_default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError(f"{value.__class__.__name__} is not JSON serializable")
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+def encode_ndjson(keys: List[str], rows: Iterable[tuple]) -> str:
+    return "".join(json.dumps(dict(zip(keys, row)), default=_json_default) + "\n" for row in rows)
+
+def encode_csv(rows: Iterable[Iterable[Any]]) -> str:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    for row in rows:
+        writer.writerow([_csv_value(value) for value in row])
+    return out.getvalue()
+
+async def stream_rows(query: Select, fmt: str, batch_size: int) -> AsyncIterator[str]:
+    # Server-side cursor over a column select: rows arrive batch_size at a time
+    # and are plain tuples, so nothing accumulates in a session identity map.
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=batch_size))
+        keys = list(result.keys())
+        if fmt == FORMAT_CSV:
+            yield encode_csv([keys])
+        async for rows in result.partitions():
+            yield encode_csv(rows) if fmt == FORMAT_CSV else encode_ndjson(keys, rows)
+
+def export_response(query: Select, fmt: str, filename: str, batch_size: int) -> StreamingResponse:
+    # The session is opened inside the generator so it lives as long as the stream
+    return StreamingResponse(
+        stream_rows(query, fmt, batch_size),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+    )
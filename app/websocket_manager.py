@@ -1,67 +1,329 @@
 from fastapi import WebSocket
-from typing import Dict, List
+from typing import Dict, FrozenSet, List, Optional, Set
+import asyncio
 import json
+import time
+from .backplane import Backplane, create_backplane
+from .config import settings
+from .metrics import registry
+
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_DISCONNECT = "disconnect"
+
+broadcast_duration = registry.histogram(
+    "ws_broadcast_duration_seconds",
+    "Time to fan a message out to local sockets",
+    ["kind"],
+    (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+)
+dropped_messages = registry.counter("ws_dropped_messages_total", "Messages dropped from full send queues")
+new_order_batches = registry.counter("ws_new_order_batches_total", "new_orders frames built, one per distinct subscription")
+coalesced_new_orders = registry.counter("ws_coalesced_new_orders_total", "new_order events folded into new_orders batches")
+
+class Connection:
+    def __init__(self, websocket: WebSocket, user_type: str, user_id: int, queue_size: int):
+        self.websocket = websocket
+        self.user_type = user_type
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.writer: Optional[asyncio.Task] = None
+        self.dropped = 0
+        self.last_seen = self.last_activity = time.monotonic()
+        # Categories of new orders this worker wants; None means all of them
+        self.categories: Optional[FrozenSet[str]] = None
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, List[WebSocket]] = {
-            "clients": [],
-            "workers": [],
-            "admins": []
+    def __init__(self, queue_size: int = None, overflow_policy: str = None):
+        self.queue_size = queue_size or settings.ws_send_queue_size
+        self.overflow_policy = overflow_policy or settings.ws_overflow_policy
+        self.active_connections: Dict[str, Set[WebSocket]] = {
+            "clients": set(),
+            "workers": set(),
+            "admins": set()
         }
-    
-    async def connect(self, websocket: WebSocket, user_type: str, user_id: int):
+        self.user_connections: Dict[int, Set[WebSocket]] = {}
+        self.connections: Dict[WebSocket, Connection] = {}
+        self.backplane: Optional[Backplane] = None
+        self.heartbeat_task: Optional[asyncio.Task] = None
+        self.rejected = 0
+        self.reaped = 0
+        self.pending_new_orders: List[dict] = []
+        self.flush_handle: Optional[asyncio.Handle] = None
+        # The event loop only keeps weak references to tasks
+        self.closing: Set[asyncio.Task] = set()
+
+    async def start(self, backplane: Backplane = None):
+        self.backplane = backplane or create_backplane()
+        await self.backplane.start(self._deliver)
+        if settings.ws_heartbeat_interval > 0:
+            self.heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self):
+        self.flush_new_orders()
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+            self.heartbeat_task = None
+        if self.backplane is not None:
+            await self.backplane.stop()
+            self.backplane = None
+
+    def _over_limit(self, user_id: int) -> bool:
+        if settings.ws_max_connections and len(self.connections) >= settings.ws_max_connections:
+            return True
+        per_user = settings.ws_max_connections_per_user
+        return bool(per_user) and len(self.user_connections.get(user_id, ())) >= per_user
+
+    async def connect(self, websocket: WebSocket, user_type: str, user_id: int) -> bool:
+        if self._over_limit(user_id):
+            self.rejected += 1
+            # Closing before accept rejects the handshake
+            await websocket.close(code=1013, reason="Too many connections")
+            return False
         await websocket.accept()
+        connection = Connection(websocket, user_type, user_id, self.queue_size)
         if user_type not in self.active_connections:
-            self.active_connections[user_type] = []
-        self.active_connections[user_type].append(websocket)
+            self.active_connections[user_type] = set()
+        self.active_connections[user_type].add(websocket)
+        self.user_connections.setdefault(user_id, set()).add(websocket)
+        self.connections[websocket] = connection
+        connection.writer = asyncio.create_task(self._writer(connection))
         await self.send_personal_message(
-            {"type": "connection", "message": f"Connected as {user_type}"}, 
+            {"type": "connection", "message": f"Connected as {user_type}"},
             websocket
         )
-    
+        return True
+
     def disconnect(self, websocket: WebSocket, user_type: str):
         if user_type in self.active_connections:
-            self.active_connections[user_type].remove(websocket)
-    
+            self.active_connections[user_type].discard(websocket)
+        connection = self.connections.pop(websocket, None)
+        if connection is None:
+            return
+        sockets = self.user_connections.get(connection.user_id)
+        if sockets is not None:
+            sockets.discard(websocket)
+            if not sockets:
+                del self.user_connections[connection.user_id]
+        if connection.writer is not None and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+
+    async def _writer(self, connection: Connection):
+        try:
+            while True:
+                text = await connection.queue.get()
+                await connection.websocket.send_text(text)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            self.disconnect(connection.websocket, connection.user_type)
+
+    def _enqueue(self, connection: Connection, text: str):
+        try:
+            connection.queue.put_nowait(text)
+            return
+        except asyncio.QueueFull:
+            connection.dropped += 1
+            dropped_messages.inc()
+
+        if self.overflow_policy == OVERFLOW_DISCONNECT:
+            self.disconnect(connection.websocket, connection.user_type)
+            self._close_later(connection.websocket, 1013, "Slow consumer")
+        else:
+            connection.queue.get_nowait()
+            connection.queue.put_nowait(text)
+
+    def handle_client_message(self, websocket: WebSocket, data: str) -> bool:
+        # Any inbound frame counts as liveness. Returns True if data was a heartbeat
+        # reply or a control message handled here
+        connection = self.connections.get(websocket)
+        if connection is None:
+            return False
+        now = time.monotonic()
+        connection.last_seen = now
+        message = self._parse_message(data)
+        message_type = message.get("type") if message else None
+        if data == "pong" or message_type == "pong":
+            return True
+        connection.last_activity = now
+        if message_type == "subscribe":
+            self._subscribe(connection, message.get("categories"))
+            return True
+        return False
+
+    @staticmethod
+    def _parse_message(data: str) -> Optional[dict]:
+        if not data.startswith("{"):
+            return None
+        try:
+            message = json.loads(data)
+        except ValueError:
+            return None
+        return message if isinstance(message, dict) else None
+
+    def _subscribe(self, connection: Connection, categories):
+        # {"type": "subscribe", "categories": [...]}; null or missing resets to all
+        if isinstance(categories, list) and all(isinstance(category, str) for category in categories):
+            connection.categories = frozenset(categories)
+        elif categories is None:
+            connection.categories = None
+        else:
+            self._enqueue(connection, json.dumps({"type": "error", "message": "categories must be a list of strings"}))
+            return
+        self._enqueue(connection, json.dumps({
+            "type": "subscribed",
+            "categories": None if connection.categories is None else sorted(connection.categories)
+        }))
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(settings.ws_heartbeat_interval)
+            self.reap_and_ping()
+
+    def reap_and_ping(self):
+        now = time.monotonic()
+        ping = json.dumps({"type": "ping"})
+        for connection in list(self.connections.values()):
+            if now - connection.last_seen > settings.ws_heartbeat_timeout:
+                self._reap(connection, 1001, "Heartbeat timeout")
+            elif settings.ws_idle_timeout and now - connection.last_activity > settings.ws_idle_timeout:
+                self._reap(connection, 1000, "Idle timeout")
+            else:
+                self._enqueue(connection, ping)
+
+    def _reap(self, connection: Connection, code: int, reason: str):
+        self.reaped += 1
+        self.disconnect(connection.websocket, connection.user_type)
+        self._close_later(connection.websocket, code, reason)
+
+    def _close_later(self, websocket: WebSocket, code: int, reason: str):
+        task = asyncio.create_task(self._close(websocket, code, reason))
+        self.closing.add(task)
+        task.add_done_callback(self.closing.discard)
+
+    async def _close(self, websocket: WebSocket, code: int, reason: str):
+        try:
+            await websocket.close(code=code, reason=reason)
+        except Exception:
+            pass
+
     async def send_personal_message(self, message: dict, websocket: WebSocket):
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            self._enqueue(connection, json.dumps(message))
+            return
         try:
             await websocket.send_text(json.dumps(message))
         except:
             pass
-    
+
     async def broadcast_to_role(self, message: dict, role: str):
         if role in self.active_connections:
-            for connection in self.active_connections[role]:
-                try:
-                    await connection.send_text(json.dumps(message))
-                except:
-                    self.active_connections[role].remove(connection)
-    
+            text = json.dumps(message)
+            for websocket in list(self.active_connections[role]):
+                self._enqueue(self.connections[websocket], text)
+
     async def send_to_user(self, message: dict, user_type: str, user_id: int):
-        if user_type in self.active_connections:
-            for connection in self.active_connections[user_type]:
-                try:
-                    await connection.send_text(json.dumps(message))
-                except:
-                    self.active_connections[user_type].remove(connection)
-    
-    async def notify_new_order(self, order_data: dict):
-        await self.broadcast_to_role({
-            "type": "new_order",
-            "data": order_data
-        }, "workers")
-    
-    async def notify_order_accepted(self, order_data: dict, client_id: int):
-        await self.broadcast_to_role({
-            "type": "order_accepted",
-            "data": order_data
-        }, "clients")
-    
-    async def notify_payment_status(self, order_data: dict, client_id: int):
-        await self.broadcast_to_role({
-            "type": "payment_status",
-            "data": order_data
-        }, "clients")
+        role_connections = self.active_connections.get(user_type, set())
+        text = json.dumps(message)
+        for websocket in list(self.user_connections.get(user_id, ())):
+            if websocket in role_connections:
+                self._enqueue(self.connections[websocket], text)
+
+    def connection_counts(self) -> Dict[str, int]:
+        return {role: len(sockets) for role, sockets in self.active_connections.items()}
+
+    def queue_depths(self) -> Dict[str, int]:
+        depths = {role: 0 for role in self.active_connections}
+        for connection in self.connections.values():
+            depths[connection.user_type] = depths.get(connection.user_type, 0) + connection.queue.qsize()
+        return depths
+
+    async def publish(self, message: dict, role: str, user_id: int = None):
+        envelope = {"role": role, "user_id": user_id, "message": message}
+        if self.backplane is None:
+            await self._deliver(envelope)
+        else:
+            await self.backplane.publish(envelope)
+
+    def coalesce_new_order(self, message: dict):
+        # new_order broadcasts are held for ws_new_order_window seconds (or until
+        # ws_new_order_max_batch arrive) and sent as one new_orders frame per worker
+        self.pending_new_orders.append(message)
+        if len(self.pending_new_orders) >= settings.ws_new_order_max_batch:
+            self.flush_new_orders()
+        elif self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(
+                settings.ws_new_order_window, self.flush_new_orders
+            )
+
+    def flush_new_orders(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        messages, self.pending_new_orders = self.pending_new_orders, []
+        if not messages:
+            return
+        started = time.perf_counter()
+        coalesced_new_orders.inc(amount=len(messages))
+        # Workers with the same subscription share one serialized frame
+        subscribers: Dict[Optional[FrozenSet[str]], List[Connection]] = {}
+        for websocket in self.active_connections.get("workers", ()):
+            connection = self.connections[websocket]
+            subscribers.setdefault(connection.categories, []).append(connection)
+        for categories, connections in subscribers.items():
+            batch = messages if categories is None else [
+                message for message in messages if message["data"].get("category") in categories
+            ]
+            if not batch:
+                continue
+            new_order_batches.inc()
+            text = json.dumps({
+                "type": "new_orders",
+                "data": [message["data"] for message in batch],
+                "seq": batch[-1].get("seq")
+            })
+            for connection in connections:
+                self._enqueue(connection, text)
+        broadcast_duration.observe(("new_orders",), time.perf_counter() - started)
+
+    async def _deliver(self, envelope: dict):
+        message = envelope["message"]
+        if message.get("type") == "new_order" and envelope.get("role") == "workers" and envelope.get("user_id") is None:
+            self.coalesce_new_order(message)
+            return
+        started = time.perf_counter()
+        if envelope.get("user_id") is None:
+            await self.broadcast_to_role(envelope["message"], envelope["role"])
+            broadcast_duration.observe(("role",), time.perf_counter() - started)
+        else:
+            await self.send_to_user(envelope["message"], envelope["role"], envelope["user_id"])
+            broadcast_duration.observe(("user",), time.perf_counter() - started)
 
 manager = ConnectionManager()
+
+registry.gauge(
+    "ws_connections",
+    "Open WebSocket connections",
+    ["role"],
+    lambda: {(role,): count for role, count in manager.connection_counts().items()}
+)
+registry.gauge(
+    "ws_queue_depth",
+    "Messages waiting in WebSocket send queues",
+    ["role"],
+    lambda: {(role,): depth for role, depth in manager.queue_depths().items()}
+)
+registry.gauge(
+    "ws_rejected_connections_total",
+    "Connections refused over the connection limits",
+    [],
+    lambda: {(): manager.rejected},
+    type="counter"
+)
+registry.gauge(
+    "ws_reaped_connections_total",
+    "Connections closed by the heartbeat reaper",
+    [],
+    lambda: {(): manager.reaped},
+    type="counter"
+)
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Rebuilds the analytics rollup tables behind /api/admin/stats from the orders table
+Run once after the rollup migration, or whenever the aggregates need repairing
+"""
+
+from app.analytics import backfill
+from app.database import SessionLocal
+from app.migrations import run_migrations
+
+def backfill_analytics():
+    """Recompute all rollups in a single transaction"""
+    run_migrations()
+    
+    db = SessionLocal()
+    
+    try:
+        counts = backfill(db)
+        print(f"📊 Status counts: {counts['statuses']} rows")
+        print(f"📅 Daily category stats: {counts['days']} rows")
+        print(f"👷 Worker completion stats: {counts['workers']} rows")
+        print("\n✅ Analytics rollups rebuilt successfully!")
+    except Exception as e:
+        print(f"❌ Error rebuilding analytics: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    print("🧮 Rebuilding Marketplace Analytics...\n")
+    backfill_analytics()
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+In-process load test for the Marketplace API. Seeds a dataset (see seed.py),
+then drives the ASGI app directly through httpx.ASGITransport - no server, no
+network - and reports p50/p95/p99 latency and requests/s per scenario:
+
+    login          POST /api/auth/token
+    browse         GET  /api/services/, /category/{c}, /{id}
+    order_create   POST /api/orders/
+    order_accept   PUT  /api/orders/{id}/accept
+    order_list     GET  /api/orders/
+    ws_fanout      order creation until every connected worker socket has the frame
+
+Results are written as JSON; pass --baseline with an earlier file to compare.
+
+    python benchmarks/run.py --output results.json
+    python benchmarks/run.py --baseline results.json --fail-on-regression
+    python benchmarks/run.py --database-url postgresql://localhost/marketplace_bench
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SCENARIOS = ["login", "browse", "order_create", "order_accept", "order_list", "ws_fanout"]
+
+# (metric, higher is better) compared against the baseline
+COMPARED_METRICS = [("p50_ms", False), ("p95_ms", False), ("p99_ms", False), ("rps", True)]
+
+def percentile(samples: List[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+def summarize(latencies: List[float], errors: int, elapsed: float, count: Optional[int] = None) -> dict:
+    # count overrides the throughput numerator, e.g. messages delivered rather than requests made
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "rps": round((count if count is not None else len(latencies)) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3) if latencies else 0.0
+    }
+
+async def measure(call: Callable[[int], Awaitable[bool]], requests: int, concurrency: int) -> dict:
+    # Runs call(0..requests-1) from `concurrency` workers; call returns False on failure
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                ok = await call(i)
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+class ASGIWebSocket:
+    # Minimal in-process WebSocket client speaking the ASGI protocol to the app
+    def __init__(self, app, path: str):
+        self.app = app
+        self.path = path
+        self.to_app: asyncio.Queue = asyncio.Queue()
+        self.from_app: asyncio.Queue = asyncio.Queue()
+        self.task: Optional[asyncio.Task] = None
+
+    async def connect(self):
+        scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": self.path,
+            "raw_path": self.path.encode(),
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"host", b"bench")],
+            "client": ("127.0.0.1", 0),
+            "server": ("bench", 80),
+            "subprotocols": []
+        }
+        self.task = asyncio.create_task(self.app(scope, self.to_app.get, self.from_app.put))
+        await self.to_app.put({"type": "websocket.connect"})
+        message = await self.from_app.get()
+        if message["type"] != "websocket.accept":
+            raise ConnectionError(f"WebSocket rejected: {message}")
+
+    async def receive_json(self) -> dict:
+        message = await self.from_app.get()
+        if message["type"] == "websocket.close":
+            raise ConnectionError(f"WebSocket closed: {message.get('code')}")
+        return json.loads(message.get("text") or message["bytes"])
+
+    async def close(self):
+        await self.to_app.put({"type": "websocket.disconnect", "code": 1000})
+        if self.task is not None:
+            try:
+                await asyncio.wait_for(self.task, timeout=5)
+            except (asyncio.TimeoutError, Exception):
+                self.task.cancel()
+
+class Benchmark:
+    def __init__(self, app, client, args, users: Dict[str, List[str]], services: List[dict]):
+        self.app = app
+        self.client = client
+        self.args = args
+        self.users = users
+        self.services = services
+        self.tokens: Dict[str, str] = {}
+        self.created_orders: List[int] = []
+        self.rng = random.Random(args.seed)
+
+    def auth(self, username: str) -> dict:
+        return {"Authorization": f"Bearer {self.tokens[username]}"}
+
+    async def measure_warm(self, call: Callable[[int], Awaitable[bool]]) -> dict:
+        # Read-only scenarios get unrecorded warmup requests to fill caches and pools first
+        await measure(call, self.args.warmup, self.args.concurrency)
+        return await measure(call, self.args.requests, self.args.concurrency)
+
+    async def login(self, username: str) -> bool:
+        response = await self.client.post("/api/auth/token", data={"username": username, "password": self.args.password})
+        if response.status_code != 200:
+            return False
+        self.tokens[username] = response.json()["access_token"]
+        return True
+
+    async def scenario_login(self) -> dict:
+        everyone = self.users["clients"] + self.users["workers"]
+        result = await measure(
+            lambda i: self.login(everyone[i % len(everyone)]),
+            self.args.requests,
+            self.args.concurrency
+        )
+        # The other scenarios need every user signed in, whatever the request count
+        missing = [username for username in everyone if username not in self.tokens]
+        await measure(lambda i: self.login(missing[i]), len(missing), self.args.concurrency)
+        return result
+
+    async def scenario_browse(self) -> dict:
+        categories = sorted({service["category"] for service in self.services})
+
+        async def call(i: int) -> bool:
+            kind = i % 3
+            if kind == 0:
+                response = await self.client.get("/api/services/", params={"skip": self.rng.randrange(0, 200, 20), "limit": 20})
+            elif kind == 1:
+                response = await self.client.get(f"/api/services/category/{self.rng.choice(categories)}")
+            else:
+                response = await self.client.get(f"/api/services/{self.rng.choice(self.services)['id']}")
+            return response.status_code == 200
+
+        return await self.measure_warm(call)
+
+    async def create_order(self, i: int) -> Optional[int]:
+        client = self.users["clients"][i % len(self.users["clients"])]
+        service = self.services[self.rng.randrange(len(self.services))]
+        response = await self.client.post("/api/orders/", json={"service_id": service["id"]}, headers=self.auth(client))
+        return response.json()["id"] if response.status_code == 200 else None
+
+    async def scenario_order_create(self) -> dict:
+        async def call(i: int) -> bool:
+            order_id = await self.create_order(i)
+            if order_id is None:
+                return False
+            self.created_orders.append(order_id)
+            return True
+
+        return await measure(call, self.args.requests, self.args.concurrency)
+
+    async def scenario_order_accept(self) -> dict:
+        # Each order accepted exactly once, so 409s would be real errors
+        order_ids = list(self.created_orders)
+        while len(order_ids) < self.args.requests:
+            order_id = await self.create_order(len(order_ids))
+            if order_id is not None:
+                order_ids.append(order_id)
+        workers = self.users["workers"]
+
+        async def call(i: int) -> bool:
+            worker = workers[i % len(workers)]
+            response = await self.client.put(f"/api/orders/{order_ids[i]}/accept", headers=self.auth(worker))
+            return response.status_code == 200
+
+        return await measure(call, self.args.requests, self.args.concurrency)
+
+    async def scenario_order_list(self) -> dict:
+        clients = self.users["clients"]
+
+        async def call(i: int) -> bool:
+            response = await self.client.get("/api/orders/", params={"limit": 50}, headers=self.auth(clients[i % len(clients)]))
+            return response.status_code == 200
+
+        return await self.measure_warm(call)
+
+    async def scenario_ws_fanout(self) -> dict:
+        # Latency is order creation until the last subscribed worker socket has the
+        # new_orders batch frame, through the outbox dispatcher and ConnectionManager
+        workers = self.users["workers"]
+        sockets = []
+        for i in range(self.args.ws_clients):
+            socket = ASGIWebSocket(self.app, f"/api/ws/auth/{self.tokens[workers[i % len(workers)]]}")
+            await socket.connect()
+            await socket.receive_json()
+            sockets.append(socket)
+
+        arrivals: Dict[int, int] = {}
+        done: Dict[int, asyncio.Event] = {}
+
+        async def reader(socket: ASGIWebSocket):
+            while True:
+                message = await socket.receive_json()
+                if message.get("type") != "new_orders":
+                    continue
+                for order in message["data"]:
+                    order_id = order["id"]
+                    arrivals[order_id] = arrivals.get(order_id, 0) + 1
+                    if arrivals[order_id] == len(sockets) and order_id in done:
+                        done[order_id].set()
+
+        readers = [asyncio.create_task(reader(socket)) for socket in sockets]
+        latencies: List[float] = []
+        errors = 0
+        started = time.perf_counter()
+        try:
+            for i in range(self.args.ws_broadcasts):
+                sent = time.perf_counter()
+                order_id = await self.create_order(i)
+                if order_id is None:
+                    errors += 1
+                    continue
+                event = done.setdefault(order_id, asyncio.Event())
+                if arrivals.get(order_id, 0) >= len(sockets):
+                    event.set()
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=self.args.ws_timeout)
+                    latencies.append(time.perf_counter() - sent)
+                except asyncio.TimeoutError:
+                    errors += 1
+            elapsed = time.perf_counter() - started
+        finally:
+            for task in readers:
+                task.cancel()
+            for socket in sockets:
+                await socket.close()
+
+        result = summarize(latencies, errors, elapsed, count=len(latencies) * len(sockets))
+        result["sockets"] = len(sockets)
+        result["rps_unit"] = "messages delivered per second"
+        return result
+
+async def load_fixtures(client) -> Tuple[Dict[str, List[str]], List[dict]]:
+    from sqlalchemy import select
+    from app.database import AsyncSessionLocal
+    from app.models import User, UserRole
+
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(User.username, User.role).where(User.username.like("bench_%")).order_by(User.id)
+        )
+        users = {"clients": [], "workers": []}
+        for username, role in result:
+            users["clients" if role == UserRole.CLIENT else "workers"].append(username)
+    services = (await client.get("/api/services/", params={"limit": 1000})).json()
+    return users, services
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def run(args) -> dict:
+    import httpx
+    from sqlalchemy.engine import make_url
+    from app.main import app
+    from seed import seed_benchmark_data
+
+    counts = await asyncio.to_thread(
+        seed_benchmark_data, args.clients, args.workers, args.services, args.orders, args.seed
+    )
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": make_url(os.environ["DATABASE_URL"]).get_backend_name(),
+            "dataset": counts,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "ws_clients": args.ws_clients
+        },
+        "scenarios": {}
+    }
+
+    # ASGITransport does not run lifespan events, so start the app by hand
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            users, services = await load_fixtures(client)
+            benchmark = Benchmark(app, client, args, users, services)
+            # login always runs first: later scenarios reuse its tokens
+            selected = ["login"] + [name for name in args.scenarios if name != "login"]
+            for name in selected:
+                print(f"  {name}...", flush=True)
+                result = await getattr(benchmark, f"scenario_{name}")()
+                if name in args.scenarios:
+                    results["scenarios"][name] = result
+    finally:
+        await app.router.shutdown()
+    return results
+
+def print_results(results: dict, baseline: Optional[dict], tolerance: float) -> List[str]:
+    # Returns the regressions beyond tolerance
+    regressions = []
+    base = (baseline or {}).get("scenarios", {})
+    header = f"{'scenario':<14} {'reqs':>6} {'err':>4} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    print("\n" + header)
+    print("-" * len(header))
+    for name, stats in results["scenarios"].items():
+        print(
+            f"{name:<14} {stats['requests']:>6} {stats['errors']:>4} {stats['rps']:>9.1f} "
+            f"{stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}"
+        )
+        if name not in base:
+            continue
+        changes = []
+        for metric, higher_is_better in COMPARED_METRICS:
+            old, new = base[name].get(metric), stats[metric]
+            if not old:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            marker = " !" if worse > tolerance else ""
+            if marker:
+                regressions.append(f"{name} {metric}: {old} -> {new} ({change:+.1%})")
+            changes.append(f"{metric} {change:+.1%}{marker}")
+        print(f"{'':<14} vs baseline: " + ", ".join(changes))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="defaults to a fresh SQLite file in a temp directory")
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=20)
+    parser.add_argument("--services", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=50, help="unrecorded requests before read-only scenarios")
+    parser.add_argument("--ws-clients", type=int, default=100, help="worker sockets for ws_fanout")
+    parser.add_argument("--ws-broadcasts", type=int, default=50)
+    parser.add_argument("--ws-timeout", type=float, default=10.0)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--password", default=None, help="password of the bench_* users (seed.BENCH_PASSWORD)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression, default 10%%")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    # Settings are read at import time, so the database is chosen before importing app
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ.setdefault("PAYMENT_GATEWAY", "fake")
+    # Every benchmark request comes from one address; measure the app, not the limiter
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    if args.password is None:
+        from seed import BENCH_PASSWORD
+        args.password = BENCH_PASSWORD
+
+    print(f"🏁 Benchmarking against {os.environ['DATABASE_URL']}")
+    results = asyncio.run(run(args))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = print_results(results, baseline, args.tolerance)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n📄 Results written to {args.output}")
+
+    if regressions:
+        print("\n⚠️ Regressions beyond tolerance:")
+        for regression in regressions:
+            print(f"   {regression}")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Seeds a benchmark dataset on top of init_db.py's sample data: bench_client{n}
+and bench_worker{n} users sharing one password, services across a handful of
+categories and a backlog of orders. Uses DATABASE_URL like the app.
+
+    DATABASE_URL=postgresql://localhost/marketplace_bench python benchmarks/seed.py --orders 20000
+"""
+
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, insert
+from init_db import init_db
+from app.analytics import backfill
+from app.auth import get_password_hash
+from app.crud import ServiceCRUD
+from app.database import SessionLocal
+from app.models import Order, OrderStatus, Service, User, UserRole
+
+BENCH_PASSWORD = "bench123"
+CATEGORIES = ["Technology", "Design", "Marketing", "Business", "Home", "Education"]
+
+def seed_benchmark_data(clients: int, workers: int, services: int, orders: int, seed: int = 1) -> dict:
+    """Create the sample data, then the benchmark users, services and orders"""
+    init_db()
+    rng = random.Random(seed)
+    db = SessionLocal()
+
+    try:
+        # One hash for every benchmark user; bcrypt per row would dominate seeding
+        hashed_password = get_password_hash(BENCH_PASSWORD)
+        existing = {username for (username,) in db.query(User.username).filter(User.username.like("bench_%"))}
+        new_users = [
+            {
+                "email": f"bench_{role.value}{i}@bench.example.com",
+                "username": f"bench_{role.value}{i}",
+                "hashed_password": hashed_password,
+                "role": role,
+                "is_active": True
+            }
+            for role, count in ((UserRole.CLIENT, clients), (UserRole.WORKER, workers))
+            for i in range(count)
+            if f"bench_{role.value}{i}" not in existing
+        ]
+        if new_users:
+            db.execute(insert(User.__table__), new_users)
+            db.commit()
+
+        missing_services = services - db.query(func.count(Service.id)).scalar()
+        if missing_services > 0:
+            ServiceCRUD.bulk_create_services(db, [
+                {
+                    "name": f"Bench service {i}",
+                    "description": f"Benchmark service number {i} for load testing",
+                    "price": round(rng.uniform(20, 800), 2),
+                    "category": CATEGORIES[i % len(CATEGORIES)]
+                }
+                for i in range(missing_services)
+            ])
+
+        client_ids = [user_id for (user_id,) in db.query(User.id).filter(User.role == UserRole.CLIENT)]
+        worker_ids = [user_id for (user_id,) in db.query(User.id).filter(User.role == UserRole.WORKER)]
+        service_prices = db.query(Service.id, Service.price).filter(Service.is_active == True).all()
+
+        missing_orders = orders - db.query(func.count(Order.id)).scalar()
+        if missing_orders > 0:
+            now = datetime.now(timezone.utc)
+            # Mostly history, with a pool of open orders left for accept benchmarks
+            statuses = [OrderStatus.COMPLETED, OrderStatus.PAID, OrderStatus.CANCELED, OrderStatus.PENDING]
+            weights = [45, 20, 5, 30]
+            rows = []
+            for i in range(missing_orders):
+                service_id, price = rng.choice(service_prices)
+                status = rng.choices(statuses, weights)[0]
+                assigned = status != OrderStatus.PENDING or rng.random() < 0.5
+                created_at = now - timedelta(seconds=rng.randrange(90 * 24 * 3600))
+                rows.append({
+                    "client_id": rng.choice(client_ids),
+                    "worker_id": rng.choice(worker_ids) if assigned else None,
+                    "service_id": service_id,
+                    "status": status,
+                    "total_amount": price,
+                    "created_at": created_at,
+                    "updated_at": created_at + timedelta(hours=rng.randrange(1, 72)) if assigned else None
+                })
+                if len(rows) >= 5000:
+                    db.execute(insert(Order.__table__), rows)
+                    rows = []
+            if rows:
+                db.execute(insert(Order.__table__), rows)
+            db.commit()
+            # Seeded orders bypass the status hooks
+            backfill(db)
+
+        return {
+            "users": len(client_ids) + len(worker_ids),
+            "services": len(service_prices),
+            "orders": db.query(func.count(Order.id)).scalar()
+        }
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=50)
+    parser.add_argument("--services", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    counts = seed_benchmark_data(args.clients, args.workers, args.services, args.orders, args.seed)
+    print(f"\n🏋️ Benchmark data: {counts['users']} users, {counts['services']} services, {counts['orders']} orders")
+    print(f"   Benchmark users log in with password {BENCH_PASSWORD}")
+
+if __name__ == "__main__":
+    main()
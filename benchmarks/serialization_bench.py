@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Serialization benchmark: compares the default response path (ORM objects
+validated through the from_attributes schemas) with the fast_serialization
+path (column-tuple selects rendered by app.serialization.RowSerializer).
+
+Seeds a throwaway SQLite database, checks both paths produce identical bytes
+and reports the time per page for each.
+
+    python benchmarks/serialization_bench.py --orders 5000 --page-size 100
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DB_PATH = os.path.join(tempfile.mkdtemp(), "serialization_bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from sqlalchemy import insert
+from app import models
+from app.api.orders import order_list_serializer
+from app.catalog_cache import service_list_adapter, service_list_serializer
+from app.crud import OrderCRUD
+from app.database import AsyncSessionLocal, Base, SessionLocal, engine
+from app.main import app
+
+CATEGORIES = ["cleaning", "plumbing", "électricité", "家政", "garden"]
+
+def seed(orders: int, users: int, services: int):
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(42)
+    start = datetime(2026, 1, 1, 8, 0, 0)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), [
+            {
+                "email": f"user{i}@example.com",
+                "username": f"user{i}",
+                "hashed_password": "x",
+                "role": models.UserRole.WORKER if i % 4 == 0 else models.UserRole.CLIENT,
+                "is_active": True,
+                "created_at": start + timedelta(seconds=i, microseconds=rng.randrange(1000000))
+            }
+            for i in range(1, users + 1)
+        ])
+        conn.execute(insert(models.Service.__table__), [
+            {
+                "name": f"Service {i} \"deluxe\"",
+                "description": "Line one\nline two – ünïcödé ✓",
+                "price": round(rng.uniform(5, 500), 2),
+                "category": CATEGORIES[i % len(CATEGORIES)],
+                "is_active": True,
+                "created_at": start + timedelta(minutes=i)
+            }
+            for i in range(1, services + 1)
+        ])
+        conn.execute(insert(models.Order.__table__), [
+            {
+                "client_id": rng.randrange(1, users + 1),
+                "worker_id": rng.choice([None, rng.randrange(1, users + 1)]),
+                "service_id": rng.randrange(1, services + 1),
+                "status": rng.choice(list(models.OrderStatus)),
+                "total_amount": rng.choice([round(rng.uniform(5, 500), 2), 100.0, 0.1 + 0.2]),
+                "payment_intent_id": rng.choice([None, f"pi_{i:08d}"]),
+                "created_at": start + timedelta(seconds=i // 3, microseconds=rng.randrange(1000000)),
+                "updated_at": rng.choice([None, start + timedelta(days=1, seconds=i)])
+            }
+            for i in range(orders)
+        ])
+
+def route_field(path: str, method: str = "GET"):
+    for route in app.routes:
+        if getattr(route, "path", None) == path and method in route.methods:
+            return route.response_field
+    raise LookupError(path)
+
+def timed(fn, repeat: int) -> float:
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+def bench_orders(page_size: int, repeat: int):
+    field = route_field("/api/orders/")
+    loop = asyncio.new_event_loop()
+    db = SessionLocal()
+
+    def reference():
+        orders, next_cursor = OrderCRUD.get_orders_page(db, limit=page_size)
+        content = loop.run_until_complete(serialize_response(field=field, response_content=orders))
+        db.expunge_all()
+        return JSONResponse(content).body
+
+    def fast():
+        keys, rows, next_cursor = OrderCRUD.get_order_rows_page(db, limit=page_size)
+        return order_list_serializer.render(keys, rows)
+
+    # Walk every page once to check the outputs match byte for byte
+    cursor, pages = None, 0
+    while True:
+        orders, next_cursor = OrderCRUD.get_orders_page(db, cursor=cursor, limit=page_size)
+        expected = JSONResponse(loop.run_until_complete(serialize_response(field=field, response_content=orders))).body
+        keys, rows, fast_cursor = OrderCRUD.get_order_rows_page(db, cursor=cursor, limit=page_size)
+        assert fast_cursor == next_cursor, (cursor, fast_cursor, next_cursor)
+        assert order_list_serializer.render(keys, rows) == expected, f"order page {pages} differs"
+        db.expunge_all()
+        pages += 1
+        if not next_cursor:
+            break
+        cursor = next_cursor
+
+    result = ("GET /api/orders/", pages, timed(reference, repeat), timed(fast, repeat))
+    db.close()
+    loop.close()
+    return result
+
+async def bench_services(repeat: int):
+    from app.crud import AsyncServiceCRUD
+
+    async with AsyncSessionLocal() as db:
+        services = await AsyncServiceCRUD.get_services(db, limit=1000)
+        expected = service_list_adapter.dump_json(service_list_adapter.validate_python(services, from_attributes=True))
+        keys, rows = await AsyncServiceCRUD.get_service_rows(db, limit=1000)
+        assert service_list_serializer.render(keys, rows) == expected, "service list differs"
+
+        # Serialization only; both reads are a single select of similar cost
+        reference = timed(
+            lambda: service_list_adapter.dump_json(service_list_adapter.validate_python(services, from_attributes=True)),
+            repeat
+        )
+        fast = timed(lambda: service_list_serializer.render(keys, rows), repeat)
+        return "catalog render (1000 services)", 1, reference, fast
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--services", type=int, default=1000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    seed(args.orders, args.users, args.services)
+    results = [
+        bench_orders(args.page_size, args.repeat),
+        asyncio.run(bench_services(args.repeat))
+    ]
+
+    print(f"{'path':<32} {'pages':>6} {'reference ms':>13} {'fast ms':>9} {'speedup':>8}")
+    for name, pages, reference, fast in results:
+        print(f"{name:<32} {pages:>6} {reference * 1000:>13.3f} {fast * 1000:>9.3f} {reference / fast:>7.1f}x")
+    print(f"fallbacks: orders={order_list_serializer.fallbacks} services={service_list_serializer.fallbacks}")
+    print(f"outputs identical; database left at {DB_PATH}")
+
+if __name__ == "__main__":
+    main()
@@ -6,14 +6,16 @@ Creates sample users, services, and initial data
 
 import asyncio
 from sqlalchemy.orm import Session
-from app.database import SessionLocal, engine
-from app.models import Base, User, Service, UserRole
+from app.database import SessionLocal
+from app.migrations import run_migrations
+from app.models import User, Service, UserRole
 from app.auth import get_password_hash
+from app.crud import ServiceCRUD
 
 def init_db():
     """Initialize database with sample data"""
-    # Create tables
-    Base.metadata.create_all(bind=engine)
+    # Create or upgrade tables
+    run_migrations()
     
     db = SessionLocal()
     
@@ -65,38 +67,33 @@ def init_db():
         if not services:
             # Create sample services
             sample_services = [
-                Service(
-                    name="Web Development",
-                    description="Professional web development services",
-                    price=500.0,
-                    category="Technology",
-                    is_active=True
-                ),
-                Service(
-                    name="Graphic Design",
-                    description="Creative graphic design solutions",
-                    price=300.0,
-                    category="Design",
-                    is_active=True
-                ),
-                Service(
-                    name="Content Writing",
-                    description="High-quality content creation",
-                    price=150.0,
-                    category="Marketing",
-                    is_active=True
-                ),
-                Service(
-                    name="Consulting",
-                    description="Business strategy consulting",
-                    price=200.0,
-                    category="Business",
-                    is_active=True
-                )
+                {
+                    "name": "Web Development",
+                    "description": "Professional web development services",
+                    "price": 500.0,
+                    "category": "Technology"
+                },
+                {
+                    "name": "Graphic Design",
+                    "description": "Creative graphic design solutions",
+                    "price": 300.0,
+                    "category": "Design"
+                },
+                {
+                    "name": "Content Writing",
+                    "description": "High-quality content creation",
+                    "price": 150.0,
+                    "category": "Marketing"
+                },
+                {
+                    "name": "Consulting",
+                    "description": "Business strategy consulting",
+                    "price": 200.0,
+                    "category": "Business"
+                }
             ]
             
-            for service in sample_services:
-                db.add(service)
+            ServiceCRUD.bulk_create_services(db, sample_services)
             
             print("🛍️ Sample services created")
         
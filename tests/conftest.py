@@ -0,0 +1,98 @@
+import json
+import os
+import tempfile
+import uuid
+
+# Settings and engines are read at import time, so the environment comes first
+_db_dir = tempfile.mkdtemp(prefix="marketplace-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_db_dir, 'test.db')}")
+os.environ["PAYMENT_GATEWAY"] = "fake"
+os.environ["BCRYPT_ROUNDS"] = "4"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["OUTBOX_POLL_INTERVAL"] = "0.05"
+os.environ["PAYMENT_RECONCILE_INTERVAL"] = "0"
+
+import httpx
+import pytest
+from app.main import app
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    # One event loop for the whole run: the app's background tasks and module
+    # level asyncio primitives are bound to the loop that started them
+    return "asyncio"
+
+@pytest.fixture(scope="session")
+async def started_app(anyio_backend):
+    await app.router.startup()
+    yield app
+    await app.router.shutdown()
+
+@pytest.fixture
+async def client(started_app):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=started_app), base_url="http://test") as client:
+        yield client
+
+async def register(client: httpx.AsyncClient, role: str) -> dict:
+    username = f"{role}_{uuid.uuid4().hex[:10]}"
+    response = await client.post("/api/auth/register", json={
+        "email": f"{username}@example.com",
+        "username": username,
+        "password": "secret123",
+        "role": role
+    })
+    assert response.status_code == 200, response.text
+    response = await client.post("/api/auth/token", data={"username": username, "password": "secret123"})
+    assert response.status_code == 200, response.text
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    user = (await client.get("/api/auth/me", headers=headers)).json()
+    return {"id": user["id"], "username": username, "headers": headers}
+
+@pytest.fixture
+async def admin(client):
+    return await register(client, "admin")
+
+@pytest.fixture
+async def customer(client):
+    return await register(client, "client")
+
+@pytest.fixture
+async def worker(client):
+    return await register(client, "worker")
+
+@pytest.fixture
+async def service(client, admin):
+    response = await client.post("/api/services/", json={
+        "name": f"Service {uuid.uuid4().hex[:6]}",
+        "description": "Test service",
+        "price": 100.0,
+        "category": f"Category {uuid.uuid4().hex[:6]}"
+    }, headers=admin["headers"])
+    assert response.status_code == 200, response.text
+    return response.json()
+
+async def create_order(client: httpx.AsyncClient, customer: dict, service: dict, **headers) -> dict:
+    response = await client.post(
+        "/api/orders/",
+        json={"service_id": service["id"]},
+        headers={**customer["headers"], **headers}
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+class FakeWebSocket:
+    def __init__(self):
+        self.frames = []
+        self.closed = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        self.frames.append(json.loads(text))
+
+    async def close(self, code: int = 1000, reason: str = None):
+        self.closed = (code, reason)
+
+    def received(self, event_type: str):
+        return [frame for frame in self.frames if frame["type"] == event_type]
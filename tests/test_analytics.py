@@ -0,0 +1,26 @@
+import asyncio
+import pytest
+from .conftest import create_order
+
+pytestmark = pytest.mark.anyio
+
+async def test_concurrent_completions_record_one_transition(client, admin, customer, worker, service):
+    order = await create_order(client, customer, service)
+    intent = (await client.post(f"/api/orders/{order['id']}/payment", headers=customer["headers"])).json()
+    confirmed = await client.post(
+        f"/api/orders/{order['id']}/payment/confirm",
+        params={"payment_intent_id": intent["payment_intent_id"]},
+        headers=customer["headers"]
+    )
+    assert confirmed.status_code == 200, confirmed.text
+    assert (await client.put(f"/api/orders/{order['id']}/accept", headers=worker["headers"])).status_code == 200
+    before = (await client.get("/api/admin/stats", headers=admin["headers"])).json()["status_counts"]
+    
+    responses = await asyncio.gather(*[
+        client.put(f"/api/orders/{order['id']}/complete", headers=worker["headers"]) for _ in range(3)
+    ])
+    
+    assert [response.status_code for response in responses] == [200, 200, 200]
+    after = (await client.get("/api/admin/stats", headers=admin["headers"])).json()["status_counts"]
+    assert after["completed"] - before["completed"] == 1
+    assert after["paid"] - before["paid"] == -1
@@ -0,0 +1,45 @@
+import pytest
+from jose import jwt
+from app import auth
+from app.config import settings
+
+pytestmark = pytest.mark.anyio
+
+def token_for(user: dict, **claims) -> dict:
+    token = auth.create_access_token({"sub": user["username"], "user_id": user["id"], **claims})
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture
+def no_principal_lookups(monkeypatch):
+    async def get_principal(token_data):
+        raise AssertionError("principal resolved")
+    monkeypatch.setattr(auth, "get_principal", get_principal)
+
+async def test_tokens_carry_role_and_active_claims(client, worker):
+    token = worker["headers"]["Authorization"].split(" ", 1)[1]
+    
+    claims = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+    
+    assert claims["user_id"] == worker["id"]
+    assert claims["role"] == "worker"
+    assert claims["is_active"] is True
+
+async def test_role_claim_rejects_without_resolving_the_caller(client, worker, no_principal_lookups):
+    response = await client.get("/api/users/", headers=worker["headers"])
+    
+    assert response.status_code == 403
+
+async def test_inactive_claim_rejects_without_resolving_the_caller(client, worker, no_principal_lookups):
+    response = await client.get("/api/auth/me", headers=token_for(worker, role="worker", is_active=False))
+    
+    assert response.status_code == 400
+
+async def test_claims_never_grant_access(client, worker):
+    response = await client.get("/api/users/", headers=token_for(worker, role="admin", is_active=True))
+    
+    assert response.status_code == 403
+
+async def test_tokens_without_claims_still_work(client, admin):
+    response = await client.get("/api/users/", headers=token_for(admin))
+    
+    assert response.status_code == 200
@@ -0,0 +1,138 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy import select
+from app import models
+from app.database import AsyncSessionLocal
+from app.idempotency import REPLAYED_HEADER, IdempotentRequest
+from app.payment_gateway import GatewayError, payment_gateway
+from .conftest import create_order
+
+pytestmark = pytest.mark.anyio
+
+async def order_count(client, customer):
+    return len((await client.get("/api/orders/", headers=customer["headers"])).json())
+
+async def claim(user_id, key):
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(
+            select(models.IdempotencyKey).where(models.IdempotencyKey.user_id == user_id, models.IdempotencyKey.key == key)
+        )).scalar_one_or_none()
+
+async def test_retry_replays_the_stored_response(client, customer, service):
+    key = uuid.uuid4().hex
+    first = await create_order(client, customer, service, **{"Idempotency-Key": key})
+    
+    response = await client.post(
+        "/api/orders/",
+        json={"service_id": service["id"]},
+        headers={**customer["headers"], "Idempotency-Key": key}
+    )
+    
+    assert response.status_code == 200
+    assert response.headers[REPLAYED_HEADER] == "true"
+    assert response.json() == first
+    assert await order_count(client, customer) == 1
+
+async def test_key_reused_for_a_different_request_is_rejected(client, customer, service):
+    key = uuid.uuid4().hex
+    await create_order(client, customer, service, **{"Idempotency-Key": key})
+    
+    response = await client.post(
+        "/api/orders/",
+        json={"service_id": service["id"], "note": "different body"},
+        headers={**customer["headers"], "Idempotency-Key": key}
+    )
+    
+    assert response.status_code == 422
+    assert response.json()["detail"] == "Idempotency-Key was already used for a different request"
+    assert await order_count(client, customer) == 1
+
+async def test_concurrent_retry_while_in_progress_gets_409(client, customer, service, monkeypatch):
+    order = await create_order(client, customer, service)
+    create_intent = payment_gateway.create_intent
+    async def slow_create_intent(*args, **kwargs):
+        await asyncio.sleep(0.2)
+        return await create_intent(*args, **kwargs)
+    monkeypatch.setattr(payment_gateway, "create_intent", slow_create_intent)
+    headers = {**customer["headers"], "Idempotency-Key": uuid.uuid4().hex}
+    
+    first = asyncio.ensure_future(client.post(f"/api/orders/{order['id']}/payment", headers=headers))
+    await asyncio.sleep(0.05)
+    second = await client.post(f"/api/orders/{order['id']}/payment", headers=headers)
+    first = await first
+    
+    assert first.status_code == 200, first.text
+    assert second.status_code == 409
+    replay = await client.post(f"/api/orders/{order['id']}/payment", headers=headers)
+    assert replay.headers[REPLAYED_HEADER] == "true"
+    assert replay.json() == first.json()
+
+async def test_failed_request_releases_the_key(client, customer, service, monkeypatch):
+    order = await create_order(client, customer, service)
+    create_intent = payment_gateway.create_intent
+    async def failing_create_intent(*args, **kwargs):
+        raise GatewayError("Card network unavailable")
+    monkeypatch.setattr(payment_gateway, "create_intent", failing_create_intent)
+    headers = {**customer["headers"], "Idempotency-Key": uuid.uuid4().hex}
+    
+    failed = await client.post(f"/api/orders/{order['id']}/payment", headers=headers)
+    monkeypatch.setattr(payment_gateway, "create_intent", create_intent)
+    retried = await client.post(f"/api/orders/{order['id']}/payment", headers=headers)
+    
+    assert failed.status_code == 400
+    assert retried.status_code == 200, retried.text
+    assert REPLAYED_HEADER not in retried.headers
+    assert retried.json()["payment_intent_id"]
+
+async def test_stale_claim_is_taken_over(client, customer, service):
+    key = uuid.uuid4().hex
+    # Left behind by a process that died mid-request
+    async with AsyncSessionLocal() as db:
+        created_at = datetime.now(timezone.utc) - timedelta(hours=1)
+        db.add(models.IdempotencyKey(
+            user_id=customer["id"],
+            key=key,
+            request_hash="stale",
+            created_at=created_at,
+            expires_at=created_at + timedelta(days=1)
+        ))
+        await db.commit()
+    
+    order = await create_order(client, customer, service, **{"Idempotency-Key": key})
+    
+    record = await claim(customer["id"], key)
+    assert record.status_code == 200
+    assert record.response["id"] == order["id"]
+
+async def test_cancelled_request_releases_the_claim(customer):
+    key = uuid.uuid4().hex
+    started = asyncio.Event()
+    async def handler(commit):
+        started.set()
+        await asyncio.sleep(10)
+    
+    async with AsyncSessionLocal() as db:
+        task = asyncio.ensure_future(IdempotentRequest(customer["id"], key, "hash").run(db, handler))
+        await started.wait()
+        assert await claim(customer["id"], key) is not None
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    
+    assert await claim(customer["id"], key) is None
+
+async def test_handler_writes_commit_only_with_the_response(client, customer, service, monkeypatch):
+    async def crash(self, db, status_code, body):
+        raise RuntimeError("process died")
+    monkeypatch.setattr(IdempotentRequest, "save", crash)
+    
+    with pytest.raises(RuntimeError):
+        await client.post(
+            "/api/orders/",
+            json={"service_id": service["id"]},
+            headers={**customer["headers"], "Idempotency-Key": uuid.uuid4().hex}
+        )
+    
+    assert await order_count(client, customer) == 0
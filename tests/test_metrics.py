@@ -0,0 +1,80 @@
+import re
+import pytest
+from app.config import settings
+from app.metrics import MetricsRegistry, http_queries, http_requests, query_threshold_exceeded
+from .conftest import create_order
+
+pytestmark = pytest.mark.anyio
+
+SAMPLE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{[a-zA-Z_][a-zA-Z0-9_]*="(\\.|[^"\\])*"(,[a-zA-Z_][a-zA-Z0-9_]*="(\\.|[^"\\])*")*\})? -?[0-9.e+-]+$')
+
+def query_samples(method: str, route: str):
+    counts, total = http_queries.values.get((method, route), ([0], [0.0]))
+    return sum(counts), total[0]
+
+async def test_requests_are_labelled_with_the_route_template(client, customer, service):
+    orders = [await create_order(client, customer, service) for _ in range(2)]
+    before = http_requests.values.get(("GET", "/api/orders/{order_id}", "200"), 0)
+    
+    for order in orders:
+        assert (await client.get(f"/api/orders/{order['id']}", headers=customer["headers"])).status_code == 200
+    await client.get("/no/such/path")
+    
+    assert http_requests.values[("GET", "/api/orders/{order_id}", "200")] - before == 2
+    assert ("GET", "unmatched", "404") in http_requests.values
+    routes = {route for _, route, _ in http_requests.values}
+    assert not any(f"/api/orders/{order['id']}" in routes for order in orders)
+
+async def test_queries_are_counted_per_request(client, customer, service, monkeypatch):
+    order = await create_order(client, customer, service)
+    requests_before, queries_before = query_samples("GET", "/api/orders/{order_id}")
+    
+    await client.get(f"/api/orders/{order['id']}", headers=customer["headers"])
+    
+    requests_after, queries_after = query_samples("GET", "/api/orders/{order_id}")
+    assert requests_after - requests_before == 1
+    assert queries_after - queries_before >= 1
+    
+    monkeypatch.setattr(settings, "metrics_query_threshold", 1)
+    exceeded_before = query_threshold_exceeded.values.get(("GET", "/api/orders/{order_id}"), 0)
+    await client.get(f"/api/orders/{order['id']}", headers=customer["headers"])
+    assert query_threshold_exceeded.values[("GET", "/api/orders/{order_id}")] - exceeded_before == 1
+
+async def test_metrics_endpoint_serves_the_text_format(client):
+    await client.get("/api/")
+    
+    response = await client.get("/metrics")
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.rstrip("\n").split("\n")
+    typed = {}
+    for line in lines:
+        if line.startswith("# HELP "):
+            continue
+        if line.startswith("# TYPE "):
+            _, _, name, metric_type = line.split(" ")
+            typed[name] = metric_type
+            continue
+        assert SAMPLE.match(line), line
+    assert typed["http_requests_total"] == "counter"
+    assert typed["http_request_duration_seconds"] == "histogram"
+    assert 'http_requests_total{method="GET",route="/api/",status="200"}' in response.text
+
+def test_histograms_render_cumulative_buckets_and_escape_labels():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency", ["path"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(('say "hi"\n',), value)
+    
+    lines = registry.render().splitlines()
+    
+    assert lines == [
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{path="say \\"hi\\"\\n",le="0.1"} 1',
+        'latency_seconds_bucket{path="say \\"hi\\"\\n",le="1"} 3',
+        'latency_seconds_bucket{path="say \\"hi\\"\\n",le="+Inf"} 4',
+        'latency_seconds_sum{path="say \\"hi\\"\\n"} 6.05',
+        'latency_seconds_count{path="say \\"hi\\"\\n"} 4',
+    ]
@@ -0,0 +1,48 @@
+import asyncio
+import pytest
+from .conftest import create_order, register
+
+pytestmark = pytest.mark.anyio
+
+async def test_concurrent_accepts_assign_the_order_once(client, customer, service):
+    order = await create_order(client, customer, service)
+    workers = [await register(client, "worker") for _ in range(5)]
+    
+    responses = await asyncio.gather(*[
+        client.put(f"/api/orders/{order['id']}/accept", headers=worker["headers"]) for worker in workers
+    ])
+    
+    assert sorted(response.status_code for response in responses) == [200, 409, 409, 409, 409]
+    winner = workers[[response.status_code for response in responses].index(200)]
+    stored = await client.get(f"/api/orders/{order['id']}", headers=customer["headers"])
+    assert stored.json()["worker_id"] == winner["id"]
+
+async def test_concurrent_claim_next_hands_out_distinct_orders(client, customer, service):
+    orders = [await create_order(client, customer, service) for _ in range(3)]
+    workers = [await register(client, "worker") for _ in range(5)]
+    
+    responses = await asyncio.gather(*[
+        client.post("/api/orders/claim-next", params={"category": service["category"]}, headers=worker["headers"])
+        for worker in workers
+    ])
+    
+    claimed = [response.json()["id"] for response in responses if response.status_code == 200]
+    assert sorted(claimed) == sorted(order["id"] for order in orders)
+    assert [response.status_code for response in responses].count(404) == 2
+
+async def test_accepting_a_closed_order_says_why(client, customer, worker, service):
+    order = await create_order(client, customer, service)
+    intent = (await client.post(f"/api/orders/{order['id']}/payment", headers=customer["headers"])).json()
+    canceled = await client.post(
+        f"/api/orders/{order['id']}/payment/cancel",
+        params={"payment_intent_id": intent["payment_intent_id"]},
+        headers=customer["headers"]
+    )
+    assert canceled.status_code == 200, canceled.text
+    
+    response = await client.put(f"/api/orders/{order['id']}/accept", headers=worker["headers"])
+    
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Order is canceled, not open for assignment"
+    missing = await client.put("/api/orders/999999999/accept", headers=worker["headers"])
+    assert missing.status_code == 404
@@ -0,0 +1,60 @@
+import asyncio
+import pytest
+from sqlalchemy import select
+from app import models
+from app.database import AsyncSessionLocal
+from app.websocket_manager import manager
+from .conftest import FakeWebSocket, create_order
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+async def connect():
+    sockets = []
+    async def connect(user_type: str, user: dict) -> FakeWebSocket:
+        websocket = FakeWebSocket()
+        assert await manager.connect(websocket, user_type, user["id"])
+        sockets.append((websocket, user_type))
+        return websocket
+    yield connect
+    for websocket, user_type in sockets:
+        manager.disconnect(websocket, user_type)
+
+async def wait_for(condition, timeout: float = 2.0):
+    for _ in range(int(timeout / 0.02)):
+        if condition():
+            return
+        await asyncio.sleep(0.02)
+    raise AssertionError("condition not met in time")
+
+def order_ids(frames):
+    return [order["id"] for frame in frames for order in frame["data"]]
+
+async def undispatched(order_id: int):
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(
+            select(models.OrderEvent).where(models.OrderEvent.order_id == order_id, models.OrderEvent.dispatched_at.is_(None))
+        )).scalars().all()
+
+async def test_new_order_is_delivered_to_workers_once(client, customer, worker, service, connect):
+    websocket = await connect("workers", worker)
+    
+    order = await create_order(client, customer, service)
+    
+    await wait_for(lambda: order["id"] in order_ids(websocket.received("new_orders")))
+    await asyncio.sleep(0.2)
+    assert order_ids(websocket.received("new_orders")).count(order["id"]) == 1
+    assert await undispatched(order["id"]) == []
+
+async def test_payment_status_reaches_only_the_owning_client(client, customer, service, connect):
+    owner = await connect("clients", customer)
+    other = await connect("clients", {"id": customer["id"] + 10_000})
+    order = await create_order(client, customer, service)
+    
+    response = await client.post(f"/api/orders/{order['id']}/payment", headers=customer["headers"])
+    
+    assert response.status_code == 200, response.text
+    await wait_for(lambda: owner.received("payment_status"))
+    assert owner.received("payment_status")[0]["data"] == {"id": order["id"], "status": "payment_created"}
+    await asyncio.sleep(0.2)
+    assert other.received("payment_status") == []
@@ -0,0 +1,126 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import time
+import uuid
+import pytest
+from app.config import settings
+from .conftest import create_order, register
+
+pytestmark = pytest.mark.anyio
+
+async def paid_events(client, customer, order_id):
+    events = (await client.get("/api/orders/events", headers=customer["headers"])).json()
+    return [
+        event for event in events
+        if event["type"] == "payment_status" and event["data"]["id"] == order_id and event["data"]["status"] == "paid"
+    ]
+
+async def category_stats(client, admin, category):
+    rows = (await client.get("/api/admin/stats/daily", params={"category": category}, headers=admin["headers"])).json()
+    return sum(row["orders_paid"] for row in rows), sum(row["revenue"] for row in rows)
+
+def signed_webhook(event: dict):
+    payload = json.dumps(event).encode()
+    timestamp = str(int(time.time()))
+    signature = hmac.new(
+        settings.stripe_webhook_secret.encode(), timestamp.encode() + b"." + payload, hashlib.sha256
+    ).hexdigest()
+    return payload, {"Stripe-Signature": f"t={timestamp},v1={signature}"}
+
+async def start_payment(client, customer, service):
+    order = await create_order(client, customer, service)
+    response = await client.post(f"/api/orders/{order['id']}/payment", headers=customer["headers"])
+    assert response.status_code == 200, response.text
+    return order, response.json()["payment_intent_id"]
+
+async def test_concurrent_confirms_record_one_payment(client, admin, customer, service):
+    order, intent_id = await start_payment(client, customer, service)
+    before = (await client.get("/api/admin/stats", headers=admin["headers"])).json()["status_counts"]
+    
+    responses = await asyncio.gather(*[
+        client.post(
+            f"/api/orders/{order['id']}/payment/confirm",
+            params={"payment_intent_id": intent_id},
+            headers=customer["headers"]
+        )
+        for _ in range(3)
+    ])
+    
+    assert [response.status_code for response in responses] == [200, 200, 200]
+    assert await category_stats(client, admin, service["category"]) == (1, 100.0)
+    after = (await client.get("/api/admin/stats", headers=admin["headers"])).json()["status_counts"]
+    assert after["pending"] - before["pending"] == -1
+    assert after["paid"] - before["paid"] == 1
+    assert len(await paid_events(client, customer, order["id"])) == 1
+
+async def test_webhook_racing_confirm_records_one_payment(client, admin, customer, service):
+    order, intent_id = await start_payment(client, customer, service)
+    payload, headers = signed_webhook({
+        "id": f"evt_{uuid.uuid4().hex}",
+        "type": "payment_intent.succeeded",
+        "data": {"object": {"object": "payment_intent", "id": intent_id, "status": "succeeded"}}
+    })
+    
+    webhook, confirm = await asyncio.gather(
+        client.post("/api/webhooks/stripe", content=payload, headers=headers),
+        client.post(
+            f"/api/orders/{order['id']}/payment/confirm",
+            params={"payment_intent_id": intent_id},
+            headers=customer["headers"]
+        )
+    )
+    
+    assert webhook.status_code == 200, webhook.text
+    assert confirm.status_code == 200, confirm.text
+    # The webhook is applied in the background
+    for _ in range(100):
+        if await paid_events(client, customer, order["id"]):
+            break
+        await asyncio.sleep(0.02)
+    await asyncio.sleep(0.2)
+    assert len(await paid_events(client, customer, order["id"])) == 1
+    assert await category_stats(client, admin, service["category"]) == (1, 100.0)
+
+async def test_cancel_after_payment_is_rejected(client, customer, service):
+    order, intent_id = await start_payment(client, customer, service)
+    confirm = await client.post(
+        f"/api/orders/{order['id']}/payment/confirm",
+        params={"payment_intent_id": intent_id},
+        headers=customer["headers"]
+    )
+    assert confirm.status_code == 200, confirm.text
+    
+    response = await client.post(
+        f"/api/orders/{order['id']}/payment/cancel",
+        params={"payment_intent_id": intent_id},
+        headers=customer["headers"]
+    )
+    
+    assert response.status_code == 409
+    stored = await client.get(f"/api/orders/{order['id']}", headers=customer["headers"])
+    assert stored.json()["status"] == "paid"
+
+async def test_malformed_signed_webhook_is_acknowledged(client):
+    payload, headers = signed_webhook({"id": f"evt_{uuid.uuid4().hex}", "type": "payment_intent.succeeded", "data": "oops"})
+    
+    response = await client.post("/api/webhooks/stripe", content=payload, headers=headers)
+    
+    assert response.status_code == 200
+
+async def test_intent_of_another_order_is_rejected(client, customer, service):
+    victim = await register(client, "client")
+    victim_order, victim_intent = await start_payment(client, victim, service)
+    own_order = await create_order(client, customer, service)
+    
+    for action in ("confirm", "cancel"):
+        response = await client.post(
+            f"/api/orders/{own_order['id']}/payment/{action}",
+            params={"payment_intent_id": victim_intent},
+            headers=customer["headers"]
+        )
+        assert response.status_code == 404
+    
+    stored = await client.get(f"/api/orders/{victim_order['id']}", headers=victim["headers"])
+    assert stored.json()["status"] == "pending"
@@ -0,0 +1,74 @@
+import asyncio
+import uuid
+import httpx
+import pytest
+from app.config import settings
+from app.ratelimit import AdmissionMiddleware, MemoryRateLimitStore, rate_limiter
+from .conftest import create_order, register
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def rate_limits(monkeypatch):
+    # Disabled for the rest of the suite; a fresh store keeps the counts per test
+    monkeypatch.setattr(settings, "rate_limit_enabled", True)
+    monkeypatch.setattr(rate_limiter, "store", MemoryRateLimitStore(shards=4, max_keys=1000))
+
+async def test_register_is_limited_per_ip(client, rate_limits):
+    responses = []
+    for _ in range(6):
+        username = f"client_{uuid.uuid4().hex[:10]}"
+        responses.append(await client.post("/api/auth/register", json={
+            "email": f"{username}@example.com",
+            "username": username,
+            "password": "secret123",
+            "role": "client"
+        }))
+    
+    assert [response.status_code for response in responses] == [200] * 5 + [429]
+    assert int(responses[-1].headers["retry-after"]) > 0
+
+async def test_login_is_limited_per_username(client, customer, rate_limits):
+    responses = [
+        await client.post("/api/auth/token", data={"username": customer["username"], "password": "wrong"})
+        for _ in range(11)
+    ]
+    
+    assert [response.status_code for response in responses] == [401] * 10 + [429]
+    assert "retry-after" in responses[-1].headers
+
+async def test_order_creation_is_limited_per_user(client, customer, service, rate_limits):
+    for _ in range(30):
+        await create_order(client, customer, service)
+    
+    response = await client.post("/api/orders/", json={"service_id": service["id"]}, headers=customer["headers"])
+    other = await register(client, "client")
+    
+    assert response.status_code == 429
+    assert (await create_order(client, other, service))["id"]
+
+async def slow_app(scope, receive, send):
+    await asyncio.sleep(0.3)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+def admission_client(**options):
+    middleware = AdmissionMiddleware(slow_app, **options)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=middleware), base_url="http://test")
+
+async def test_admission_sheds_when_the_queue_is_full():
+    async with admission_client(max_concurrency=2, queue_size=1, queue_timeout=5, retry_after=1) as client:
+        responses = await asyncio.gather(*[client.get("/") for _ in range(5)])
+    
+    assert sorted(response.status_code for response in responses) == [200, 200, 200, 503, 503]
+    for response in responses:
+        if response.status_code == 503:
+            assert response.headers["retry-after"] == "1"
+
+async def test_admission_sheds_after_the_queue_timeout():
+    async with admission_client(max_concurrency=2, queue_size=10, queue_timeout=0.1, retry_after=1) as client:
+        responses = await asyncio.gather(*[client.get("/") for _ in range(5)])
+        exempt = await asyncio.gather(*[client.get("/metrics") for _ in range(3)])
+    
+    assert sorted(response.status_code for response in responses) == [200, 200, 503, 503, 503]
+    assert [response.status_code for response in exempt] == [200, 200, 200]
@@ -0,0 +1,38 @@
+import json
+import uuid
+import pytest
+from app.crud import AsyncServiceCRUD
+
+pytestmark = pytest.mark.anyio
+
+def ndjson(rows) -> str:
+    return "".join(json.dumps(row) + "\n" for row in rows)
+
+async def test_failed_chunk_reports_the_rows_that_failed(client, admin, monkeypatch):
+    bulk_create_services = AsyncServiceCRUD.bulk_create_services
+    async def reject_reserved(db, rows):
+        for row in rows:
+            if row["name"] == "reserved":
+                raise ValueError("name 'reserved' is not allowed")
+        await bulk_create_services(db, rows)
+    monkeypatch.setattr(AsyncServiceCRUD, "bulk_create_services", staticmethod(reject_reserved))
+    category = f"Bulk {uuid.uuid4().hex[:6]}"
+    rows = [
+        {"name": name, "description": "Imported", "price": 10.0, "category": category}
+        for name in ("first", "reserved", "third")
+    ]
+    
+    response = await client.post(
+        "/api/services/bulk",
+        content=ndjson(rows),
+        headers={**admin["headers"], "Content-Type": "application/x-ndjson"}
+    )
+    
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert result["inserted"] == 2
+    assert result["errors"] == [{"line": 2, "error": "Insert failed: ValueError: name 'reserved' is not allowed"}]
+    services = (await client.get("/api/services/", params={"limit": 1000})).json()
+    imported = [service for service in services if service["category"] == category]
+    assert sorted(service["name"] for service in imported) == ["first", "third"]
+    assert all(service["is_active"] for service in imported)
@@ -0,0 +1,45 @@
+import asyncio
+import time
+import pytest
+from app.config import settings
+from app.websocket_manager import ConnectionManager
+from .conftest import FakeWebSocket
+
+pytestmark = pytest.mark.anyio
+
+async def test_silent_connections_are_reaped(monkeypatch):
+    monkeypatch.setattr(settings, "ws_idle_timeout", 0)
+    manager = ConnectionManager()
+    silent, answering = FakeWebSocket(), FakeWebSocket()
+    await manager.connect(silent, "workers", 1)
+    await manager.connect(answering, "workers", 2)
+    writer = manager.connections[silent].writer
+    manager.connections[silent].last_seen = time.monotonic() - settings.ws_heartbeat_timeout - 1
+    manager.connections[answering].last_seen = time.monotonic() - settings.ws_heartbeat_timeout - 1
+    manager.handle_client_message(answering, '{"type": "pong"}')
+    
+    manager.reap_and_ping()
+    
+    assert silent not in manager.connections
+    assert answering in manager.connections
+    assert manager.reaped == 1
+    assert len(manager.closing) == 1
+    await asyncio.gather(*manager.closing)
+    assert silent.closed == (1001, "Heartbeat timeout")
+    assert writer.cancelled() or writer.done()
+    manager.disconnect(answering, "workers")
+
+async def test_connections_per_user_are_capped(monkeypatch):
+    monkeypatch.setattr(settings, "ws_max_connections_per_user", 2)
+    manager = ConnectionManager()
+    sockets = [FakeWebSocket() for _ in range(3)]
+    
+    accepted = [await manager.connect(websocket, "clients", 7) for websocket in sockets]
+    
+    assert accepted == [True, True, False]
+    assert sockets[2].closed == (1013, "Too many connections")
+    assert manager.rejected == 1
+    manager.disconnect(sockets[0], "clients")
+    assert await manager.connect(FakeWebSocket(), "clients", 7)
+    for websocket in list(manager.connections):
+        manager.disconnect(websocket, "clients")